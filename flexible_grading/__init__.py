@@ -1,9 +1,33 @@
-from . import bottom_toolbar, gui, remaining, styling, top_toolbar, vim_shortcuts, zoom
+from . import (
+    analytics,
+    bottom_toolbar,
+    deck_profiles,
+    gui,
+    idle_tasks,
+    patching,
+    perf_budget,
+    recorder,
+    render_stats,
+    remaining,
+    review_history,
+    styling,
+    top_toolbar,
+    vim_shortcuts,
+    zoom,
+)
 
 styling.init()
+deck_profiles.init()
 top_toolbar.main()
 bottom_toolbar.main()
 gui.main()
 vim_shortcuts.main()
 zoom.init()
 remaining.init()
+recorder.init()
+render_stats.init()
+perf_budget.init()
+patching.reviewer_patches.install()
+review_history.init()
+analytics.init()
+idle_tasks.init()
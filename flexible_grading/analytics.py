@@ -0,0 +1,286 @@
+# Copyright: Ajatt-Tools and contributors; https://github.com/Ajatt-Tools
+# License: GNU AGPL, version 3 or later; http://www.gnu.org/licenses/agpl.html
+
+import abc
+import functools
+import queue
+import sqlite3
+import threading
+from collections import Counter
+from collections.abc import Sequence
+from typing import Any, Callable, Final, NamedTuple, Optional
+
+from anki.collection import Collection
+from anki.consts import REVLOG_RESCHED, REVLOG_REV
+from aqt import gui_hooks, mw
+from aqt.operations import QueryOp
+from aqt.utils import tooltip
+
+from .consts import ADDON_NAME
+
+# Revlog ids are millisecond timestamps. Each query covers at most this many days of reviews.
+CHUNK_MS: Final[int] = 30 * 86_400 * 1000
+QueryFunc = Callable[..., Sequence[Sequence[Any]]]
+ErrorFunc = Callable[[Exception], None]
+
+
+class RevlogAggregate(abc.ABC):
+    """
+    A statistic computed over revlog in chunks.
+    The query must accept two parameters, the start (inclusive) and the end (exclusive) of a revlog id range.
+    """
+
+    sql: str
+
+    @abc.abstractmethod
+    def accumulate(self, rows: Sequence[Sequence[Any]]) -> None:
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    def result(self) -> Any:
+        raise NotImplementedError()
+
+
+class RetentionPerEase(RevlogAggregate):
+    """Share of each answer button among review (not learning) answers."""
+
+    sql = f""" SELECT ease, COUNT(*) FROM revlog WHERE id >= ? AND id < ? AND type = {REVLOG_REV} GROUP BY ease """
+
+    def __init__(self) -> None:
+        self._counts: Counter[int] = Counter()
+
+    def accumulate(self, rows: Sequence[Sequence[Any]]) -> None:
+        for ease, count in rows:
+            self._counts[ease] += count
+
+    def result(self) -> dict[int, float]:
+        total = sum(self._counts.values()) or 1
+        return {ease: count / total for ease, count in sorted(self._counts.items())}
+
+
+class PassRate(RevlogAggregate):
+    """Share of review answers that weren't "Again". This is what matters in pass/fail mode."""
+
+    sql = f""" SELECT ease > 1, COUNT(*) FROM revlog WHERE id >= ? AND id < ? AND type = {REVLOG_REV} GROUP BY 1 """
+
+    def __init__(self) -> None:
+        self._counts: Counter[bool] = Counter()
+
+    def accumulate(self, rows: Sequence[Sequence[Any]]) -> None:
+        for passed, count in rows:
+            self._counts[bool(passed)] += count
+
+    def result(self) -> float:
+        return self._counts[True] / (sum(self._counts.values()) or 1)
+
+
+class TimePerCardDistribution(RevlogAggregate):
+    """Number of answers per whole second spent on the card. Anki caps the time at 60 seconds by default."""
+
+    sql = """ SELECT MIN(time / 1000, 60), COUNT(*) FROM revlog WHERE id >= ? AND id < ? GROUP BY 1 """
+
+    def __init__(self) -> None:
+        self._counts: Counter[int] = Counter()
+
+    def accumulate(self, rows: Sequence[Sequence[Any]]) -> None:
+        for seconds, count in rows:
+            self._counts[seconds] += count
+
+    def result(self) -> dict[int, int]:
+        return dict(sorted(self._counts.items()))
+
+
+class RevlogStamp(NamedTuple):
+    """
+    Tells whether revlog changed since a statistic was taken.
+    The last id alone misses imported and synced reviews that are older than the newest local one.
+    """
+
+    last_id: int
+    count: int
+
+
+class RevlogStampAggregate(RevlogAggregate):
+    sql = """ SELECT MAX(id), COUNT(*) FROM revlog WHERE id >= ? AND id < ? """
+
+    def __init__(self) -> None:
+        self._last_id = 0
+        self._count = 0
+
+    def accumulate(self, rows: Sequence[Sequence[Any]]) -> None:
+        for last_id, count in rows:
+            self._last_id = max(self._last_id, last_id or 0)
+            self._count += count
+
+    def result(self) -> RevlogStamp:
+        return RevlogStamp(self._last_id, self._count)
+
+
+class DailyReviewCounts(RevlogAggregate):
+    """
+    Number of reviews per Anki day. Used by the streak and the heatmap.
+    The stamp of revlog is taken in the same pass.
+    """
+
+    def __init__(self, offset: int) -> None:
+        # Seconds between midnight UTC and the start of an Anki day.
+        self.offset = offset
+        self.sql = (
+            f""" SELECT (id / 1000 - {int(offset)}) / 86400, SUM(type != {REVLOG_RESCHED}), COUNT(*), MAX(id) """
+            f""" FROM revlog WHERE id >= ? AND id < ? GROUP BY 1 """
+        )
+        self._counts: Counter[int] = Counter()
+        self._stamp = RevlogStampAggregate()
+
+    def accumulate(self, rows: Sequence[Sequence[Any]]) -> None:
+        for day, reviews, count, last_id in rows:
+            self._counts[day] += reviews
+        self._stamp.accumulate([(last_id, count) for _day, _reviews, count, last_id in rows])
+
+    @property
+    def stamp(self) -> RevlogStamp:
+        return self._stamp.result()
+
+    def result(self) -> dict[int, int]:
+        return dict(self._counts)
+
+
+def compute(query: QueryFunc, aggregate: RevlogAggregate, should_stop: Callable[[], bool] = lambda: False) -> Any:
+    ((first_id, last_id),) = query("SELECT MIN(id), MAX(id) FROM revlog")
+    if first_id is not None:
+        for chunk_start in range(first_id, last_id + 1, CHUNK_MS):
+            if should_stop():
+                break
+            aggregate.accumulate(query(aggregate.sql, chunk_start, chunk_start + CHUNK_MS))
+    return aggregate.result()
+
+
+def report_error(exception: Exception) -> None:
+    tooltip(f"{ADDON_NAME}: Couldn't compute review statistics: {exception}")
+
+
+def open_read_only(col_path: str) -> Optional[sqlite3.Connection]:
+    try:
+        # timeout=0: a locked file is refused right away instead of after the default 5 seconds.
+        conn = sqlite3.connect(f"file:{col_path}?mode=ro", uri=True, timeout=0, check_same_thread=False)
+        conn.execute("SELECT 1 FROM revlog LIMIT 1").fetchall()
+    except sqlite3.Error:
+        # Anki keeps the collection in exclusive locking mode, so other connections may be refused.
+        return None
+    return conn
+
+
+class AnalyticsWorker:
+    """
+    Runs revlog statistics off the GUI thread, so that they never add latency to the reviewer.
+    Queries go through a separate read-only SQLite connection to the collection file,
+    opened and used on the worker's own thread.
+    Anki usually keeps the collection in exclusive locking mode, which refuses other connections.
+    Then the statistic runs as a QueryOp, which is how Anki itself reads the collection in the background.
+    A refused collection is remembered, and its later statistics go straight to QueryOp.
+    Revlog is split into chunks to keep every query short.
+    Results and errors are posted back to the GUI thread.
+    """
+
+    _stop = object()
+
+    def __init__(self) -> None:
+        self._tasks: queue.Queue = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._col_path: Optional[str] = None
+        # Set by the worker thread once the connection is open.
+        self._conn: Optional[sqlite3.Connection] = None
+        self._refused_paths: set[str] = set()
+        self._stopping = threading.Event()
+
+    def submit(
+        self,
+        aggregate: RevlogAggregate,
+        on_done: Callable[[Any], None],
+        on_error: ErrorFunc = report_error,
+    ) -> None:
+        """Schedule a statistic. on_done receives the result on the GUI thread."""
+        assert mw and mw.col
+        if mw.col.path in self._refused_paths:
+            return self._submit_query_op(aggregate, on_done, on_error)
+        if self._thread is not None and self._col_path != mw.col.path:
+            self.stop()
+        if self._thread is None:
+            self._start(mw.col.path)
+        self._tasks.put((aggregate, on_done, on_error))
+
+    @staticmethod
+    def _submit_query_op(aggregate: RevlogAggregate, on_done: Callable[[Any], None], on_error: ErrorFunc) -> None:
+        def op(col: Collection) -> Any:
+            return compute(col.db.all, aggregate)
+
+        QueryOp(parent=mw, op=op, success=on_done).failure(on_error).run_in_background()
+
+    def _start(self, col_path: str) -> None:
+        self._stopping.clear()
+        self._col_path = col_path
+        self._thread = threading.Thread(
+            target=self._run,
+            args=(col_path,),
+            name="ajt__flexible_grading__analytics",
+            daemon=True,
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is None:
+            return
+        self._stopping.set()
+        if self._conn is not None:
+            # Aborts the running query, so that the thread releases the collection file right away.
+            # Done before the stop marker is queued, because the thread closes the connection after reading it.
+            self._conn.interrupt()
+        self._tasks.put(self._stop)
+        self._thread.join()
+        self._thread = None
+        self._col_path = None
+
+    def _run(self, col_path: str) -> None:
+        conn = self._conn = open_read_only(col_path)
+        if conn is None:
+            self._refused_paths.add(col_path)
+        try:
+            while (task := self._tasks.get()) is not self._stop:
+                if self._stopping.is_set():
+                    continue
+                if conn is None:
+                    # Tasks queued before the connection was refused.
+                    mw.taskman.run_on_main(functools.partial(self._submit_query_op, *task))
+                    continue
+                self._run_task(conn, *task)
+        finally:
+            self._conn = None
+            if conn is not None:
+                conn.close()
+
+    def _run_task(
+        self,
+        conn: sqlite3.Connection,
+        aggregate: RevlogAggregate,
+        on_done: Callable[[Any], None],
+        on_error: ErrorFunc,
+    ) -> None:
+        def query(sql: str, *args) -> Sequence[Sequence[Any]]:
+            return conn.execute(sql, args).fetchall()
+
+        try:
+            result = compute(query, aggregate, self._stopping.is_set)
+        except Exception as e:
+            if not self._stopping.is_set():
+                mw.taskman.run_on_main(functools.partial(on_error, e))
+        else:
+            if not self._stopping.is_set():
+                mw.taskman.run_on_main(functools.partial(on_done, result))
+
+
+analytics_worker = AnalyticsWorker()
+
+
+def init() -> None:
+    # The worker holds a connection to the collection file. Release it before the collection closes.
+    gui_hooks.profile_will_close.append(analytics_worker.stop)
@@ -0,0 +1,72 @@
+# Copyright: Ajatt-Tools and contributors; https://github.com/Ajatt-Tools
+# License: GNU AGPL, version 3 or later; http://www.gnu.org/licenses/agpl.html
+
+import functools
+import re
+from typing import Callable, NamedTuple
+
+CELL_RE = re.compile(r"<td\b.*?</td>", flags=re.DOTALL | re.IGNORECASE)
+BUTTON_TAG = "<button"
+
+
+class AnswerButtonCell(NamedTuple):
+    html: str
+    # Markup between this cell and the next one, e.g. the newlines Anki puts between cells.
+    suffix: str = ""
+
+
+class AnswerButtonTable(NamedTuple):
+    """
+    The table of answer buttons made by Reviewer._answerButtons,
+    split into the markup before the first cell, the cells, and the markup after the last cell.
+    Nothing is dropped: without edits, `to_html()` returns the parsed HTML unchanged.
+    Edits return a new table. The HTML is put together once, in `to_html()`.
+    """
+
+    head: str
+    cells: tuple[AnswerButtonCell, ...]
+    tail: str
+    disabled: bool = False
+
+    def with_cell(self, index: int, cell_html: str) -> "AnswerButtonTable":
+        """Inserts a cell right before the <td> of the cell at `index`. The markup between cells stays in place."""
+        cells = (*self.cells[:index], AnswerButtonCell(cell_html), *self.cells[index:])
+        return self._replace(cells=cells)
+
+    def with_middle_cell(self, cell_html: str) -> "AnswerButtonTable":
+        return self.with_cell(len(self.cells) // 2, cell_html)
+
+    def with_disabled_buttons(self) -> "AnswerButtonTable":
+        return self._replace(disabled=True)
+
+    def to_html(self) -> str:
+        html = "".join((self.head, *(cell.html + cell.suffix for cell in self.cells), self.tail))
+        if self.disabled:
+            html = html.replace(BUTTON_TAG, f"{BUTTON_TAG} disabled")
+        return html
+
+
+@functools.lru_cache(maxsize=8)
+def parse_answer_buttons(html: str) -> AnswerButtonTable:
+    """Parses the HTML once. The same HTML is often edited twice per card, e.g. on the front and on the back."""
+    matches = list(CELL_RE.finditer(html))
+    if not matches:
+        return AnswerButtonTable(head=html, cells=(), tail="")
+    return AnswerButtonTable(
+        head=html[: matches[0].start()],
+        cells=tuple(
+            AnswerButtonCell(match.group(), html[match.end() : next_match.start()])
+            for match, next_match in zip(matches, matches[1:])
+        )
+        + (AnswerButtonCell(matches[-1].group()),),
+        tail=html[matches[-1].end() :],
+    )
+
+
+def make_replacer(replacements: dict[str, str]) -> Callable[[str], str]:
+    """Returns a function that makes all replacements in one pass over the string."""
+    if not replacements:
+        return str
+    # Longer patterns go first, so that they win over their own prefixes, e.g. '<button ' over '<button'.
+    pattern = re.compile("|".join(re.escape(old) for old in sorted(replacements, key=len, reverse=True)))
+    return functools.partial(pattern.sub, lambda match: replacements[match.group()])
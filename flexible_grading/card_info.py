@@ -0,0 +1,133 @@
+# Copyright: Ajatt-Tools and contributors; https://github.com/Ajatt-Tools
+# License: GNU AGPL, version 3 or later; http://www.gnu.org/licenses/agpl.html
+
+import datetime
+import html
+from collections.abc import Sequence
+from typing import Optional
+
+import aqt
+from anki.cards import Card, CardId
+from anki.consts import REVLOG_CRAM, REVLOG_LRN, REVLOG_RELRN, REVLOG_RESCHED, REVLOG_REV
+from anki.utils import html_to_text_line
+from aqt import mw
+from aqt.qt import *
+from aqt.utils import restoreGeom, saveGeom
+
+from .ajt_common.consts import ADDON_SERIES
+from .config import config
+from .consts import ADDON_NAME
+
+REVLOG_LIMIT = 8
+REVLOG_TYPES = {
+    REVLOG_LRN: "Learn",
+    REVLOG_REV: "Review",
+    REVLOG_RELRN: "Relearn",
+    REVLOG_CRAM: "Filtered",
+    REVLOG_RESCHED: "Manual",
+}
+
+
+def recent_revlog(card_id: CardId, limit: int = REVLOG_LIMIT) -> Sequence[Sequence]:
+    """Fetch the most recent review log entries of the card with a single indexed query."""
+    assert mw
+    return mw.col.db.all(
+        """ SELECT id, ease, ivl, time, type FROM revlog WHERE cid = ? ORDER BY id DESC LIMIT ? """,
+        card_id,
+        limit,
+    )
+
+
+def format_revlog_ivl(ivl: int) -> str:
+    # Negative values are seconds, positive values are days.
+    if ivl < 0:
+        return f"{-ivl / 60:.0f}m"
+    return f"{ivl}d"
+
+
+def format_revlog_row(revlog_id: int, ease: int, ivl: int, time_ms: int, revlog_type: int) -> str:
+    label = config.get_label(ease) if ease else "Manual"
+    return (
+        "<tr>"
+        f"<td>{datetime.datetime.fromtimestamp(revlog_id / 1000):%Y-%m-%d %H:%M}</td>"
+        f"<td>{REVLOG_TYPES.get(revlog_type, 'Unknown')}</td>"
+        f'<td style="color: {config.get_label_color(label) if ease else "gray"};">{label}</td>'
+        f"<td>{format_revlog_ivl(ivl)}</td>"
+        f"<td>{time_ms / 1000:.1f}s</td>"
+        "</tr>"
+    )
+
+
+def format_fields(card: Card) -> str:
+    return "".join(
+        f"<tr><th>{html.escape(name)}</th><td>{html.escape(html_to_text_line(value))}</td></tr>"
+        for name, value in card.note().items()
+    )
+
+
+def format_card_info(card: Card, interval: str) -> str:
+    revlog_rows = "".join(format_revlog_row(*row) for row in recent_revlog(card.id))
+    return f"""
+    <h3>Interval: {html.escape(interval)}</h3>
+    <table cellpadding="3">{format_fields(card)}</table>
+    <h3>Recent reviews</h3>
+    <table cellpadding="3">
+    <tr><th>Date</th><th>Type</th><th>Rating</th><th>Interval</th><th>Time</th></tr>
+    {revlog_rows or '<tr><td colspan="5">No reviews yet.</td></tr>'}
+    </table>
+    """
+
+
+class LastCardInfoDialog(QDialog):
+    """
+    A small popup showing the last answered card.
+    It is created once and hidden between uses to avoid paying for widget construction every time.
+    """
+
+    name = f"{ADDON_SERIES} {ADDON_NAME} Last Card Info"
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.setWindowTitle(f"{ADDON_SERIES} Last Card")
+        self.setMinimumSize(420, 320)
+        self._card_id: Optional[CardId] = None
+        self._text = QTextBrowser()
+        self._button_box = QDialogButtonBox(QDialogButtonBox.StandardButton.Close, parent=self)
+        self._browse_button = self._button_box.addButton("Open in &Browser", QDialogButtonBox.ButtonRole.ActionRole)
+        self.setup_layout()
+        self.connect_buttons()
+        restoreGeom(self, self.name)
+
+    def setup_layout(self) -> None:
+        layout = QVBoxLayout(self)
+        layout.addWidget(self._text)
+        layout.addWidget(self._button_box)
+        self.setLayout(layout)
+
+    def connect_buttons(self) -> None:
+        qconnect(self._browse_button.clicked, self.open_in_browser)
+        qconnect(self._button_box.rejected, self.reject)
+
+    def show_card(self, card: Card, interval: str) -> None:
+        self._card_id = card.id
+        self._text.setHtml(format_card_info(card, interval))
+        self.show()
+        self.raise_()
+        self.activateWindow()
+
+    def open_in_browser(self) -> None:
+        if self._card_id is None:
+            return
+        browser: aqt.browser.Browser = aqt.dialogs.open("Browser", mw)
+        browser.activateWindow()
+        browser.form.searchEdit.lineEdit().setText(f"cid:{self._card_id}")  # search_for
+        if hasattr(browser, "onSearch"):
+            browser.onSearch()
+        else:
+            browser.onSearchActivated()
+        self.hide()
+
+    def done(self, *args, **kwargs) -> None:
+        # Don't destroy the dialog, it is reused for the next card.
+        saveGeom(self, self.name)
+        return super().done(*args, **kwargs)
@@ -1,6 +1,8 @@
 # Copyright: Ren Tatsumoto <tatsu at autistici.org>
 # License: GNU AGPL, version 3 or later; http://www.gnu.org/licenses/agpl.html
+import copy
 import enum
+from typing import Any
 
 from .ajt_common.addon_config import AddonConfigManager, ConfigSubViewBase
 
@@ -36,6 +38,16 @@ class RemainingCountType(enum.Enum):
     none = enum.auto()
 
 
+class RepsDoneTodayScope(enum.Enum):
+    """
+    Which reviews the "reps done today" counter includes.
+    Collection counts all reviews. Deck counts reviews of cards in the current deck and its subdecks.
+    """
+
+    collection = enum.auto()
+    deck = enum.auto()
+
+
 class FlexibleGradingConfig(AddonConfigManager):
     def __init__(self, default: bool = False) -> None:
         super().__init__(default)
@@ -49,6 +61,14 @@ class FlexibleGradingConfig(AddonConfigManager):
     def remaining_count_type(self, value: RemainingCountType) -> None:
         self["remaining_count_type"] = value.name
 
+    @property
+    def reps_done_today_scope(self) -> RepsDoneTodayScope:
+        return RepsDoneTodayScope[self["reps_done_today_scope"]]
+
+    @reps_done_today_scope.setter
+    def reps_done_today_scope(self, value: RepsDoneTodayScope) -> None:
+        self["reps_done_today_scope"] = value.name
+
     @property
     def scroll(self) -> ScrollKeysConfig:
         return self._scroll
@@ -97,7 +117,8 @@ class FlexibleGradingConfig(AddonConfigManager):
 
     def get_key(self, answer: str) -> str:
         """Returns shortcut key for answer button, e.g. 'again'=>'h'."""
-        return self._config["buttons"].get(answer.lower(), "").lower()
+        answer = answer.lower()
+        return self._config["buttons"].get(answer, self._default_config["buttons"].get(answer, "")).lower()
 
     def set_key(self, answer: str, letter: str):
         """Sets shortcut key for answer button, e.g. 'again'=>'h'."""
@@ -120,5 +141,57 @@ class FlexibleGradingConfig(AddonConfigManager):
     def show_reps_done_today(self) -> bool:
         return bool(self["show_reps_done_today"])
 
+    @property
+    def show_review_streak(self) -> bool:
+        return bool(self["show_review_streak"])
+
+    @property
+    def show_review_heatmap(self) -> bool:
+        return bool(self["show_review_heatmap"])
+
+    @property
+    def deck_overrides(self) -> dict[str, dict[str, Any]]:
+        """Maps deck names to options that differ from the global ones. Subdecks inherit them."""
+        return self["deck_overrides"]
+
+    @property
+    def flip_and_grade_window_ms(self) -> int:
+        return self["flip_and_grade_window_ms"]
+
+    @flip_and_grade_window_ms.setter
+    def flip_and_grade_window_ms(self, window_ms: int) -> None:
+        self["flip_and_grade_window_ms"] = int(window_ms)
+
+    @property
+    def performance_budget_ms(self) -> int:
+        return self["performance_budget_ms"]
+
+    @performance_budget_ms.setter
+    def performance_budget_ms(self, budget_ms: int) -> None:
+        self["performance_budget_ms"] = int(budget_ms)
+
+    @property
+    def triage_batch_size(self) -> int:
+        return self["triage_batch_size"]
+
+    @triage_batch_size.setter
+    def triage_batch_size(self, n_cards: int) -> None:
+        self["triage_batch_size"] = int(n_cards)
+
+    @property
+    def enable_count_prefix(self) -> bool:
+        return bool(self["enable_count_prefix"])
+
+    @property
+    def record_review_sessions(self) -> bool:
+        return bool(self["record_review_sessions"])
+
+    @property
+    def measure_bottom_bar_render(self) -> bool:
+        return bool(self["measure_bottom_bar_render"])
+
+    def as_dict(self) -> dict[str, Any]:
+        return copy.deepcopy(self._config)
+
 
 config = FlexibleGradingConfig()
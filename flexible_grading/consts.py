@@ -1,7 +1,11 @@
 # Copyright: Ren Tatsumoto <tatsu at autistici.org>
 # License: GNU AGPL, version 3 or later; http://www.gnu.org/licenses/agpl.html
 
+import pathlib
+from typing import Final
+
 ADDON_NAME = "Flexible Grading"
+USER_FILES_DIR: Final[pathlib.Path] = pathlib.Path(__file__).parent / "user_files"
 HTML_COLORS_LINK = "https://www.w3schools.com/colors/colors_groups.asp"
 SCHED_NAG_MSG = """
 <font color="gray">
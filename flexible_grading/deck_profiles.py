@@ -0,0 +1,130 @@
+# Copyright: Ajatt-Tools and contributors; https://github.com/Ajatt-Tools
+# License: GNU AGPL, version 3 or later; http://www.gnu.org/licenses/agpl.html
+
+from collections.abc import Sequence
+from typing import Any, NamedTuple, Optional
+
+from anki.cards import Card
+from anki.collection import Collection, OpChanges
+from anki.decks import DeckId
+from aqt import gui_hooks, mw
+
+from .config import config
+
+# Options that can be set per deck in `deck_overrides`.
+PROFILE_KEYS = (
+    "pass_fail",
+    "flexible_grading",
+    "hide_button_times",
+    "color_buttons",
+    "colors",
+)
+PASS_FAIL_BUTTONS = ("again", "good")
+ALL_BUTTONS = ("again", "hard", "good", "easy")
+
+
+class DeckProfile(NamedTuple):
+    pass_fail: bool
+    flexible_grading: bool
+    hide_button_times: bool
+    color_buttons: bool
+    colors: dict[str, str]
+
+    @classmethod
+    def from_settings(cls, settings: dict[str, Any]) -> "DeckProfile":
+        return cls(**{key: settings[key] for key in PROFILE_KEYS})
+
+    @property
+    def answer_buttons(self) -> Sequence[str]:
+        # In PassFail mode pressing 'Hard' and 'Easy' is not allowed.
+        return PASS_FAIL_BUTTONS if self.pass_fail else ALL_BUTTONS
+
+    def get_ease_color(self, ease: int, default_ease: int) -> str:
+        return self.colors[config.get_label(ease, default_ease).lower()]
+
+
+def merge_settings(parent: dict[str, Any], overrides: dict[str, Any]) -> dict[str, Any]:
+    settings = {**parent, **{key: value for key, value in overrides.items() if key in PROFILE_KEYS}}
+    # Colors can be overridden one by one.
+    settings["colors"] = {**parent["colors"], **{k.lower(): v for k, v in overrides.get("colors", {}).items()}}
+    return settings
+
+
+class DeckProfileTable:
+    """
+    Grading settings of every deck, with `deck_overrides` inherited down the deck tree.
+    The table is compiled once when the collection loads or the config or decks change,
+    so that resolving the settings of a card takes a single dict lookup.
+    """
+
+    def __init__(self) -> None:
+        self._default: Optional[DeckProfile] = None
+        self._table: dict[DeckId, DeckProfile] = {}
+        self._enabled_anywhere: frozenset[str] = frozenset()
+        self._answer_buttons_anywhere: Sequence[str] = ALL_BUTTONS
+
+    def rebuild(self, col: Optional[Collection] = None) -> None:
+        default_settings = {key: config[key] for key in PROFILE_KEYS}
+        default_settings["colors"] = config.colors
+        self._default = DeckProfile.from_settings(default_settings)
+        self._table = {}
+
+        overrides = {name.casefold(): value for name, value in config.deck_overrides.items()}
+        if overrides and col is not None:
+            settings_by_name: dict[str, dict[str, Any]] = {}
+            # Parents sort before their children, so their settings are always resolved first.
+            for deck in sorted(col.decks.all_names_and_ids(), key=lambda deck: deck.name.casefold()):
+                name = deck.name.casefold()
+                parent = settings_by_name.get(name.rpartition("::")[0], default_settings)
+                settings = settings_by_name[name] = merge_settings(parent, overrides.get(name, {}))
+                self._table[DeckId(deck.id)] = DeckProfile.from_settings(settings)
+
+        profiles = [self._default, *self._table.values()]
+        self._enabled_anywhere = frozenset(
+            key for key in PROFILE_KEYS if key != "colors" and any(getattr(profile, key) for profile in profiles)
+        )
+        self._answer_buttons_anywhere = (
+            PASS_FAIL_BUTTONS if all(profile.pass_fail for profile in profiles) else ALL_BUTTONS
+        )
+
+    @property
+    def default(self) -> DeckProfile:
+        if self._default is None:
+            self.rebuild()
+        assert self._default
+        return self._default
+
+    def for_deck(self, deck_id: DeckId) -> DeckProfile:
+        return self._table.get(deck_id) or self.default
+
+    def for_card(self, card: Optional[Card]) -> DeckProfile:
+        if card is None:
+            return self.default
+        # Cards in filtered decks follow the settings of their home deck.
+        return self.for_deck(card.odid or card.did)
+
+    def is_enabled_anywhere(self, key: str) -> bool:
+        """True if a boolean option is on in at least one deck. Used to skip work when it's off everywhere."""
+        if self._default is None:
+            self.rebuild()
+        return key in self._enabled_anywhere
+
+    def answer_buttons_anywhere(self) -> Sequence[str]:
+        """Answer buttons allowed in at least one deck. Their keys have to be bound in the reviewer."""
+        if self._default is None:
+            self.rebuild()
+        return self._answer_buttons_anywhere
+
+
+deck_profiles = DeckProfileTable()
+
+
+def on_operation_did_execute(changes: OpChanges, _handler: Optional[object]) -> None:
+    # Decks were added, renamed or moved.
+    if changes.deck and mw and mw.col:
+        deck_profiles.rebuild(mw.col)
+
+
+def init() -> None:
+    gui_hooks.collection_did_load.append(deck_profiles.rebuild)
+    gui_hooks.operation_did_execute.append(on_operation_did_execute)
@@ -16,8 +16,11 @@ from .ajt_common.grab_key import ShortCutGrabButton
 from .ajt_common.monospace_line_edit import MonoSpaceLineEdit
 from .ajt_common.utils import ui_translate
 from .ajt_common.widget_placement import place_widgets_in_grid
-from .config import FlexibleGradingConfig, RemainingCountType, config
+from .config import FlexibleGradingConfig, RemainingCountType, RepsDoneTodayScope, config
 from .consts import ADDON_NAME, HTML_COLORS_LINK, SCHED_NAG_MSG
+from .live_settings import apply_changed_settings
+from .render_stats import setup_render_stats_action
+from .triage import setup_triage_action
 
 as_label = ui_translate
 
@@ -28,7 +31,7 @@ class SimpleKeyEdit(MonoSpaceLineEdit):
 
     def __init__(self, *args, **kwargs) -> None:
         super().__init__(*args, **kwargs)
-        key_regex = QRegularExpression(r'^[-a-z0-9:;<>=?@~|`_/&!#$%^*(){}"+\]\[\\\']?$')
+        key_regex = QRegularExpression(r'^[-a-z0-9:;<>=?@~|`_/&!#$%^*(){}"+.,\]\[\\\']?$')
         key_validator = QRegularExpressionValidator(key_regex, self)
         self.setValidator(key_validator)
         self.setPlaceholderText("Key letter")
@@ -47,6 +50,39 @@ class ScrollAmountSpinBox(QSpinBox):
             self.setValue(initial_value)
 
 
+class FlipAndGradeSpinBox(QSpinBox):
+    _default_allowed_range: tuple[int, int] = (0, 1000)
+    _single_step_amount: int = 50
+
+    def __init__(self, parent=None) -> None:
+        super().__init__(parent)
+        self.setRange(*self._default_allowed_range)
+        self.setSingleStep(self._single_step_amount)
+        self.setSuffix(" ms")
+        self.setSpecialValueText("Off")
+
+
+class PerformanceBudgetSpinBox(QSpinBox):
+    _default_allowed_range: tuple[int, int] = (0, 100)
+
+    def __init__(self, parent=None) -> None:
+        super().__init__(parent)
+        self.setRange(*self._default_allowed_range)
+        self.setSuffix(" ms")
+        self.setSpecialValueText("Off")
+
+
+class TriageBatchSizeSpinBox(QSpinBox):
+    _default_allowed_range: tuple[int, int] = (4, 400)
+    _single_step_amount: int = 4
+
+    def __init__(self, parent=None) -> None:
+        super().__init__(parent)
+        self.setRange(*self._default_allowed_range)
+        self.setSingleStep(self._single_step_amount)
+        self.setSuffix(" cards")
+
+
 def make_color_line_edits() -> dict[str, ColorEditPicker]:
     d = {}
     for label in config.colors:
@@ -93,7 +129,11 @@ class SettingsMenuUI(QDialog):
     _button_box: QDialogButtonBox
     _restore_settings_button: QPushButton
     _scroll_amount_spin: QSpinBox
+    _flip_and_grade_spin: QSpinBox
+    _performance_budget_spin: QSpinBox
+    _triage_batch_size_spin: QSpinBox
     _remaining_count_combo: EnumSelectCombo
+    _reps_done_today_scope_combo: EnumSelectCombo
 
     def __init__(self, *args, **kwargs) -> None:
         super().__init__(*args, **kwargs)
@@ -105,7 +145,11 @@ class SettingsMenuUI(QDialog):
         self._scroll_shortcut_edits = make_scroll_shortcut_edits()
         self._color_buttons_gbox = QGroupBox("Color buttons")
         self._scroll_amount_spin = ScrollAmountSpinBox()
+        self._flip_and_grade_spin = FlipAndGradeSpinBox()
+        self._performance_budget_spin = PerformanceBudgetSpinBox()
+        self._triage_batch_size_spin = TriageBatchSizeSpinBox()
         self._remaining_count_combo = EnumSelectCombo(enum_type=RemainingCountType)
+        self._reps_done_today_scope_combo = EnumSelectCombo(enum_type=RepsDoneTodayScope)
         self._button_box = QDialogButtonBox(OK_AND_CANCEL, parent=self)
         self._restore_settings_button = self._button_box.addButton(
             _("Restore &Defaults"), QDialogButtonBox.ButtonRole.ResetRole
@@ -135,6 +179,8 @@ class SettingsMenuUI(QDialog):
         layout.addWidget(self.make_zoom_group(), 2, 0, 1, 1)
         # Scroll shortcuts and scroll amount
         layout.addWidget(self.make_scroll_group(), 2, 1, 1, 1)
+        # Performance measurements
+        layout.addWidget(self.make_diagnostics_group(), 3, 0, 1, 2)
         return layout
 
     @staticmethod
@@ -187,7 +233,10 @@ class SettingsMenuUI(QDialog):
             "flexible_grading",
             "show_last_review",
             "show_reps_done_today",
+            "show_review_streak",
+            "show_review_heatmap",
             "press_answer_key_to_flip_card",
+            "enable_count_prefix",
         )
         gbox = QGroupBox("Features")
         gbox.setCheckable(False)
@@ -199,6 +248,9 @@ class SettingsMenuUI(QDialog):
             )
         )
         form.addRow("Show remaining count:", self._remaining_count_combo)
+        form.addRow("Count reps done today in:", self._reps_done_today_scope_combo)
+        form.addRow("Flip-and-grade window:", self._flip_and_grade_spin)
+        form.addRow("Triage batch size:", self._triage_batch_size_spin)
         gbox.setLayout(form)
         return gbox
 
@@ -228,6 +280,24 @@ class SettingsMenuUI(QDialog):
         gbox.setLayout(form)
         return gbox
 
+    def make_diagnostics_group(self) -> QGroupBox:
+        keys = (
+            "record_review_sessions",
+            "measure_bottom_bar_render",
+        )
+        gbox = QGroupBox("Diagnostics")
+        gbox.setCheckable(False)
+        form = QFormLayout()
+        form.addRow(
+            place_widgets_in_grid(
+                (self._toggleables[key] for key in keys),
+                n_columns=self._n_columns,
+            )
+        )
+        form.addRow("Performance budget per card:", self._performance_budget_spin)
+        gbox.setLayout(form)
+        return gbox
+
     def add_tooltips(self) -> None:
         self._toggleables["pass_fail"].setToolTip('"Hard" and "Easy" buttons will be hidden.')
         self._toggleables["flexible_grading"].setToolTip(
@@ -257,9 +327,43 @@ class SettingsMenuUI(QDialog):
             "Answer keys ('h', 'j', 'k', 'l' by default) will be used\n"
             "to reveal the back side, similarly to the Space bar."
         )
+        self._toggleables["enable_count_prefix"].setToolTip(
+            "Type a number before a scroll key to scroll several steps at once.\n"
+            "Digits that aren't used to grade cards start the count."
+        )
+        self._reps_done_today_scope_combo.setToolTip(
+            "Collection: Count all reviews done today.\n"
+            "Deck: Count only the reviews of cards in the current deck and its subdecks."
+        )
+        self._flip_and_grade_spin.setToolTip(
+            "Used with 'Press answer key to flip card'.\n"
+            "Pressing an answer key twice within this time grades the card\n"
+            "without showing its back side.\n"
+            "A single press shows the back side after the same delay."
+        )
+        self._triage_batch_size_spin.setToolTip("Number of cards shown at once in 'Triage...'.")
+        self._performance_budget_spin.setToolTip(
+            "If the add-on takes longer than this to process each card,\n"
+            "the heatmap, button times and other decorations are turned off one by one.\n"
+            "They are turned back on when there's time to spare."
+        )
         self._toggleables["show_reps_done_today"].setToolTip(
             "Print the number of reviews done today on the bottom bar."
         )
+        self._toggleables["record_review_sessions"].setToolTip(
+            "Save key presses and add-on events of each review session to a file.\n"
+            "Used to measure the add-on's performance."
+        )
+        self._toggleables["measure_bottom_bar_render"].setToolTip(
+            "Measure how long the bottom bar takes to draw the answer buttons.\n"
+            "Open 'Render Stats' in the add-on's menu to see the results."
+        )
+        self._toggleables["show_review_streak"].setToolTip(
+            "Print the number of consecutive days with reviews on the bottom bar."
+        )
+        self._toggleables["show_review_heatmap"].setToolTip(
+            "Draw the number of reviews done in the last 30 days on the bottom bar."
+        )
 
 
 class SettingsMenuDialog(SettingsMenuUI):
@@ -282,7 +386,11 @@ class SettingsMenuDialog(SettingsMenuUI):
         for scroll_direction, shortcut_str in cm.scroll.items():
             self._scroll_shortcut_edits[scroll_direction].setValue(shortcut_str)
         self._scroll_amount_spin.setValue(config.scroll_amount)
+        self._flip_and_grade_spin.setValue(cm["flip_and_grade_window_ms"])
+        self._performance_budget_spin.setValue(cm["performance_budget_ms"])
+        self._triage_batch_size_spin.setValue(cm["triage_batch_size"])
         self._remaining_count_combo.setCurrentName(config.remaining_count_type)
+        self._reps_done_today_scope_combo.setCurrentName(config.reps_done_today_scope)
 
     def connect_buttons(self) -> None:
         qconnect(
@@ -293,6 +401,7 @@ class SettingsMenuDialog(SettingsMenuUI):
         qconnect(self._button_box.rejected, self.reject)
 
     def accept(self) -> None:
+        old_config = config.as_dict()
         config["color_buttons"] = self._color_buttons_gbox.isChecked()
         for label, lineedit in self._colors.items():
             config.set_color(label, lineedit.text())
@@ -303,8 +412,14 @@ class SettingsMenuDialog(SettingsMenuUI):
         for scroll_direction, key_edit_widget in self._scroll_shortcut_edits.items():
             config.scroll[scroll_direction] = key_edit_widget.value()
         config.scroll_amount = self._scroll_amount_spin.value()
+        config.flip_and_grade_window_ms = self._flip_and_grade_spin.value()
+        config.performance_budget_ms = self._performance_budget_spin.value()
+        config.triage_batch_size = self._triage_batch_size_spin.value()
         config.remaining_count_type = self._remaining_count_combo.currentData()
+        config.reps_done_today_scope = self._reps_done_today_scope_combo.currentData()
         config.write_config()
+        # Apply changes in place, so that the dialog can be used mid-review.
+        apply_changed_settings(old_config, config.as_dict())
         return super().accept()
 
     def done(self, *args, **kwargs) -> None:
@@ -314,8 +429,6 @@ class SettingsMenuDialog(SettingsMenuUI):
 
 def on_open_settings() -> None:
     assert mw
-    if mw.state != "deckBrowser":
-        mw.moveToState("deckBrowser")
     dialog = SettingsMenuDialog(mw)
     dialog.exec()
 
@@ -329,3 +442,5 @@ def setup_settings_action(parent: QWidget) -> QAction:
 def main() -> None:
     root_menu = menu_root_entry()
     root_menu.addAction(setup_settings_action(root_menu))
+    root_menu.addAction(setup_triage_action(root_menu))
+    root_menu.addAction(setup_render_stats_action(root_menu))
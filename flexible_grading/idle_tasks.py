@@ -0,0 +1,129 @@
+# Copyright: Ajatt-Tools and contributors; https://github.com/Ajatt-Tools
+# License: GNU AGPL, version 3 or later; http://www.gnu.org/licenses/agpl.html
+
+import enum
+import heapq
+import itertools
+import time
+from collections.abc import Iterator
+from typing import Callable, Optional, Union
+
+from aqt import gui_hooks, mw
+from aqt.qt import *
+
+TaskResult = Union[None, Iterator[None]]
+TaskFunc = Callable[[], TaskResult]
+
+
+class Priority(enum.IntEnum):
+    high = 0
+    normal = 1
+    low = 2
+
+
+class IdleTask:
+    __slots__ = ("priority", "seq", "key", "func", "cancelled")
+
+    def __init__(self, priority: Priority, seq: int, key: Optional[str], func: Union[TaskFunc, Iterator[None]]):
+        self.priority = priority
+        self.seq = seq
+        self.key = key
+        self.func = func
+        self.cancelled = False
+
+    def __lt__(self, other: "IdleTask") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class IdleTaskScheduler:
+    """
+    Runs deferred chores on the GUI thread when the user isn't doing anything.
+    Tasks are run in small time-budgeted slices on timer ticks.
+    A task may be a generator function: each yield ends a slice, and the rest runs on a later tick.
+    The scheduler stays quiet for a moment after every review keypress.
+    """
+
+    tick_ms: int = 50
+    budget_s: float = 0.004
+    quiet_period_s: float = 0.15
+
+    def __init__(self) -> None:
+        self._heap: list[IdleTask] = []
+        self._by_key: dict[str, IdleTask] = {}
+        self._seq = itertools.count()
+        self._timer: Optional[QTimer] = None
+        self._busy_until = 0.0
+
+    def __len__(self) -> int:
+        return sum(not task.cancelled for task in self._heap)
+
+    def schedule(self, func: TaskFunc, priority: Priority = Priority.normal, key: Optional[str] = None) -> None:
+        """
+        Queue a task. If a task with the same key is pending, it is replaced,
+        so e.g. repeated config writes collapse into one.
+        """
+        if key is not None and (pending := self._by_key.pop(key, None)):
+            pending.cancelled = True
+        self._push(IdleTask(priority, next(self._seq), key, func))
+        self._ensure_timer()
+
+    def _push(self, task: IdleTask) -> None:
+        heapq.heappush(self._heap, task)
+        if task.key is not None:
+            self._by_key[task.key] = task
+
+    def note_activity(self) -> None:
+        """Called when the user presses a review key. Postpones pending tasks."""
+        self._busy_until = time.perf_counter() + self.quiet_period_s
+
+    def run_pending(self, budget_s: Optional[float] = None) -> None:
+        deadline = time.perf_counter() + (self.budget_s if budget_s is None else budget_s)
+        while self._heap and time.perf_counter() < deadline:
+            task = heapq.heappop(self._heap)
+            if task.cancelled:
+                continue
+            if task.key is not None:
+                del self._by_key[task.key]
+            self._run_slice(task)
+
+    def _run_slice(self, task: IdleTask) -> None:
+        if not isinstance(task.func, Iterator):
+            result = task.func()
+            if not isinstance(result, Iterator):
+                return
+            task.func = result
+        try:
+            next(task.func)
+        except StopIteration:
+            return
+        # Not finished yet. Keep the original order among tasks of the same priority.
+        self._push(task)
+
+    def flush(self) -> None:
+        """Run everything right now, e.g. before the profile closes."""
+        while self._heap:
+            self.run_pending(budget_s=float("inf"))
+
+    def _ensure_timer(self) -> None:
+        if self._timer is None:
+            assert mw
+            self._timer = QTimer(mw)
+            self._timer.setInterval(self.tick_ms)
+            qconnect(self._timer.timeout, self._on_tick)
+        if not self._timer.isActive():
+            self._timer.start()
+
+    def _on_tick(self) -> None:
+        if time.perf_counter() < self._busy_until:
+            return
+        self.run_pending()
+        if not self._heap and self._timer:
+            self._timer.stop()
+
+
+idle_scheduler = IdleTaskScheduler()
+
+
+def init() -> None:
+    # Must be registered after other add-on modules have queued their work on profile close.
+    gui_hooks.profile_will_close.append(idle_scheduler.flush)
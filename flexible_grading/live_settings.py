@@ -0,0 +1,104 @@
+# Copyright: Ajatt-Tools and contributors; https://github.com/Ajatt-Tools
+# License: GNU AGPL, version 3 or later; http://www.gnu.org/licenses/agpl.html
+
+import json
+from typing import Any
+
+from aqt import mw
+
+from .config import config
+from .deck_profiles import PROFILE_KEYS, deck_profiles
+from .perf_budget import perf_budget
+from .recorder import session_recorder
+from .remaining import studied_today
+from .review_history import daily_reviews, is_enabled as is_review_history_enabled
+from .styling import render_probe_js
+from .zoom import remove_zoom_shortcuts, set_zoom_shortcuts
+
+# Options that change the "Edit" and "More" buttons, which are drawn only when the bottom bar loads.
+BOTTOM_HTML_KEYS = frozenset(("remove_buttons", "prevent_clicks"))
+# Options that change which keys are bound in the reviewer.
+SHORTCUT_KEYS = frozenset(
+    ("buttons", "scroll", "scroll_amount", "pass_fail", "deck_overrides", "enable_count_prefix")
+)
+# Options that change the counters next to the answer buttons.
+REMAINING_KEYS = frozenset(
+    (
+        "remaining_count_type",
+        "show_reps_done_today",
+        "reps_done_today_scope",
+        "show_review_streak",
+        "show_review_heatmap",
+    )
+)
+# Options that need the per-day review counts.
+REVIEW_HISTORY_KEYS = frozenset(("show_review_streak", "show_review_heatmap"))
+# Options that change the scripts loaded in the bottom bar.
+BOTTOM_SCRIPT_KEYS = frozenset(("measure_bottom_bar_render",))
+
+REPLACE_BOTTOM_HTML_JS = """\
+(() => {
+    const template = document.createElement("template");
+    template.innerHTML = %s;
+    const outer = template.content.getElementById("outer");
+    if (outer) {
+        document.getElementById("outer")?.replaceWith(outer);
+    }
+})();
+"""
+
+
+def changed_keys(old: dict[str, Any], new: dict[str, Any]) -> frozenset[str]:
+    return frozenset(key for key in new.keys() | old.keys() if old.get(key) != new.get(key))
+
+
+def refresh_reviewer(changed: frozenset[str]) -> None:
+    """Re-render the bottom bar of the reviewer in place, without reloading the card."""
+    reviewer = mw.reviewer
+    if mw.state != "review" or reviewer.card is None:
+        return
+    if changed & SHORTCUT_KEYS:
+        # Old shortcuts must be deleted first. Qt ignores keys that are bound twice.
+        mw.clearStateShortcuts()
+        # noinspection PyProtectedMember
+        mw.setStateShortcuts(reviewer._shortcutKeys())
+    if changed & BOTTOM_SCRIPT_KEYS:
+        reviewer.bottom.web.eval(render_probe_js(config.measure_bottom_bar_render))
+    if changed & BOTTOM_HTML_KEYS:
+        # noinspection PyProtectedMember
+        reviewer.bottom.web.eval(REPLACE_BOTTOM_HTML_JS % json.dumps(reviewer._bottomHTML()))
+    # Answer buttons depend on most options (see REMAINING_KEYS), and redrawing them is cheap.
+    if reviewer.state == "question":
+        reviewer._showAnswerButton()
+    elif reviewer.state == "answer":
+        reviewer._showEaseButtons()
+
+
+def apply_changed_settings(old: dict[str, Any], new: dict[str, Any]) -> None:
+    """Called after the settings dialog saved the config. Updates only what depends on the changed options."""
+    assert mw
+    changed = changed_keys(old, new)
+    if not changed:
+        return
+    if changed & {*PROFILE_KEYS, "deck_overrides"}:
+        deck_profiles.rebuild(mw.col)
+    if "set_zoom_shortcuts" in changed:
+        if config["set_zoom_shortcuts"]:
+            set_zoom_shortcuts()
+        else:
+            remove_zoom_shortcuts()
+    if "show_last_review" in changed and not config.show_last_review:
+        mw.ajt__flexible_grading__last_ease.hide()
+    if "reps_done_today_scope" in changed:
+        studied_today.invalidate()
+    if changed & REVIEW_HISTORY_KEYS and is_review_history_enabled() and not daily_reviews.is_loaded:
+        # Only when the streak or the heatmap was just turned on. Otherwise a running rebuild would be thrown away.
+        daily_reviews.load(mw.col)
+    if "record_review_sessions" in changed:
+        if config.record_review_sessions and mw.state == "review":
+            session_recorder.start()
+        else:
+            session_recorder.stop()
+    if "performance_budget_ms" in changed:
+        perf_budget.configure()
+    refresh_reviewer(changed)
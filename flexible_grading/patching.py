@@ -0,0 +1,150 @@
+# Copyright: Ajatt-Tools and contributors; https://github.com/Ajatt-Tools
+# License: GNU AGPL, version 3 or later; http://www.gnu.org/licenses/agpl.html
+
+import enum
+import functools
+from typing import Any, Callable, NamedTuple, Optional, Protocol
+
+from aqt.reviewer import Reviewer
+
+
+class Position(enum.Enum):
+    # Same meaning as in anki.hooks.wrap().
+    # "around" handlers receive the original method as the `_old` keyword argument.
+    around = enum.auto()
+    after = enum.auto()
+
+
+def always_enabled() -> bool:
+    return True
+
+
+class MethodPatch(NamedTuple):
+    handler: Callable
+    position: Position
+    is_enabled: Callable[[], bool]
+
+
+class Meter(Protocol):
+    def measure(self, func: Callable, *args, **kwargs) -> Any:
+        """Calls `func` and records the time spent in it, unless a measurement is already running."""
+        ...
+
+    def unmetered(self, func: Callable, *args, **kwargs) -> Any:
+        """Calls `func` and excludes its time from the running measurement."""
+        ...
+
+
+def call_metered(meter: Meter, handler: Callable, inner: Callable, self, args: tuple, kwargs: dict) -> Any:
+    """Calls an "around" handler and records the time spent in it, minus the time spent in the original method."""
+    return meter.measure(handler, self, *args, _old=functools.partial(meter.unmetered, inner), **kwargs)
+
+
+def make_dispatcher(patch: MethodPatch, inner: Callable, registry: "PatchRegistry") -> Callable:
+    """
+    Returns a replacement for `inner` that calls the patch handler directly,
+    or calls `inner` right away if the patch is disabled by config.
+    If the registry has a meter, the time spent in the handler is reported to it.
+    """
+    handler, is_enabled = patch.handler, patch.is_enabled
+
+    if patch.position == Position.around:
+
+        def dispatcher(self, *args, **kwargs):
+            if not is_enabled():
+                return inner(self, *args, **kwargs)
+            if (meter := registry.meter) is not None:
+                return call_metered(meter, handler, inner, self, args, kwargs)
+            return handler(self, *args, _old=inner, **kwargs)
+
+    else:
+
+        def dispatcher(self, *args, **kwargs):
+            if not is_enabled():
+                return inner(self, *args, **kwargs)
+            inner(self, *args, **kwargs)
+            if (meter := registry.meter) is not None:
+                return meter.measure(handler, self, *args, **kwargs)
+            return handler(self, *args, **kwargs)
+
+    return functools.wraps(inner)(dispatcher)
+
+
+class PatchRegistry:
+    """
+    Collects patches for the methods of a class and installs one dispatcher per patch.
+    Unlike anki.hooks.wrap(), a disabled patch costs a single config check,
+    and all patches can be removed at runtime, e.g. to measure the add-on's overhead.
+    Hook callbacks that belong to the patches are added and removed together with them.
+    """
+
+    def __init__(self, target: type) -> None:
+        self._target = target
+        self._patches: dict[str, list[MethodPatch]] = {}
+        self._hooks: list[tuple[Any, Callable]] = []
+        self._hooks_installed = False
+        self._originals: dict[str, Callable] = {}
+        self._installed: dict[str, Callable] = {}
+        # Receives the time spent in each enabled handler. Set while the performance budget is on.
+        self.meter: Optional[Meter] = None
+
+    @property
+    def is_installed(self) -> bool:
+        return bool(self._installed) or self._hooks_installed
+
+    def register(
+        self,
+        method_name: str,
+        handler: Callable,
+        position: Position = Position.around,
+        is_enabled: Callable[[], bool] = always_enabled,
+    ) -> None:
+        assert not self.is_installed, "patches must be registered before they are installed"
+        self._patches.setdefault(method_name, []).append(MethodPatch(handler, position, is_enabled))
+
+    def register_hook(self, hook: Any, callback: Callable) -> None:
+        """Register a callback for one of Anki's hooks, e.g. gui_hooks.reviewer_will_init_answer_buttons."""
+        assert not self.is_installed, "hooks must be registered before they are installed"
+        self._hooks.append((hook, callback))
+
+    def original(self, method_name: str) -> Callable:
+        """Returns the method as it was before the add-on patched it."""
+        return self._originals.get(method_name) or getattr(self._target, method_name)
+
+    def install(self) -> None:
+        for method_name, patches in self._patches.items():
+            if method_name in self._installed:
+                # Left in place by uninstall().
+                continue
+            self._originals[method_name] = method = getattr(self._target, method_name)
+            for patch in patches:
+                method = make_dispatcher(patch, method, self)
+            setattr(self._target, method_name, method)
+            self._installed[method_name] = method
+        if not self._hooks_installed:
+            for hook, callback in self._hooks:
+                hook.append(callback)
+            self._hooks_installed = True
+
+    def uninstall(self) -> list[str]:
+        """
+        Restores the original methods and removes the hook callbacks.
+        Returns the names of the methods that couldn't be restored.
+        """
+        kept = []
+        for method_name, dispatcher in list(self._installed.items()):
+            if getattr(self._target, method_name) is not dispatcher:
+                # Another add-on wrapped the method after us. Restoring it would drop their changes.
+                # The patch stays installed, and original() keeps returning the unpatched method.
+                kept.append(f"{self._target.__name__}.{method_name}")
+                continue
+            setattr(self._target, method_name, self._originals.pop(method_name))
+            del self._installed[method_name]
+        if self._hooks_installed:
+            for hook, callback in self._hooks:
+                hook.remove(callback)
+            self._hooks_installed = False
+        return kept
+
+
+reviewer_patches = PatchRegistry(Reviewer)
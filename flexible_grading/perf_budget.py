@@ -0,0 +1,195 @@
+# Copyright: Ajatt-Tools and contributors; https://github.com/Ajatt-Tools
+# License: GNU AGPL, version 3 or later; http://www.gnu.org/licenses/agpl.html
+
+import collections
+import functools
+import statistics
+import time
+from collections.abc import Callable
+from typing import Any, NamedTuple, Optional
+
+from anki.cards import Card
+from aqt import gui_hooks
+
+from .config import config
+from .deck_profiles import deck_profiles
+from .patching import reviewer_patches
+
+# Features are turned off in this order when the add-on is too slow, and turned back on in reverse.
+SHED_ORDER = (
+    "show_review_heatmap",
+    "button_times",
+    "show_reps_done_today",
+    "show_review_streak",
+    "color_buttons",
+    "show_last_review",
+)
+SHED_LABELS = {
+    "show_review_heatmap": "heatmap",
+    "button_times": "times",
+    "show_reps_done_today": "reps",
+    "show_review_streak": "streak",
+    "color_buttons": "colors",
+    "show_last_review": "last ease",
+}
+
+
+def is_feature_on(feature: str) -> bool:
+    """Features that are already off in the config can't be shed."""
+    if feature == "button_times":
+        return not deck_profiles.default.hide_button_times
+    if feature == "color_buttons":
+        return deck_profiles.is_enabled_anywhere("color_buttons")
+    return bool(config[feature])
+
+
+class ShedFeature(NamedTuple):
+    name: str
+    # Mean per-card overhead before the feature was turned off.
+    mean_before_s: float
+    # How much turning it off saved. Known after the next full window.
+    cost_s: Optional[float] = None
+
+
+class PerformanceBudget:
+    """
+    Measures the time the add-on spends on each card and keeps it under `performance_budget_ms`.
+    The mean of every `window_size` cards is compared with the budget.
+    If it's over the budget, the next feature in SHED_ORDER is turned off.
+    If turning the last shed feature back on would still leave headroom, it is restored.
+    The saved time is only an estimate, so a feature is also retried after `retry_windows` windows under the budget.
+    """
+
+    window_size: int = 20
+    # Restore a feature only if the expected overhead stays below this share of the budget.
+    restore_ratio: float = 0.75
+    retry_windows: int = 15
+
+    def __init__(self) -> None:
+        self._card_s = 0.0
+        # Nested measurements are part of the outermost one and aren't recorded again.
+        self._depth = 0
+        # Time spent in unmetered calls (e.g. Anki's own code) during the outermost measurement.
+        self._excluded_s = 0.0
+        self._window: collections.deque[float] = collections.deque(maxlen=self.window_size)
+        self._shed: list[ShedFeature] = []
+        self._shed_names: frozenset[str] = frozenset()
+        self._windows_under_budget = 0
+
+    @property
+    def is_active(self) -> bool:
+        return config.performance_budget_ms > 0
+
+    @property
+    def has_shed(self) -> bool:
+        return bool(self._shed)
+
+    @property
+    def shed_features(self) -> list[str]:
+        return [feature.name for feature in self._shed]
+
+    def allows(self, feature: str) -> bool:
+        return feature not in self._shed_names
+
+    def measure(self, func: Callable, *args, **kwargs) -> Any:
+        """Calls `func` and adds the time spent in it to the current card."""
+        self._depth += 1
+        if self._depth > 1:
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self._depth -= 1
+        self._excluded_s = 0.0
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            self._card_s += time.perf_counter() - start - self._excluded_s
+            self._depth -= 1
+
+    def unmetered(self, func: Callable, *args, **kwargs) -> Any:
+        """Calls `func` outside of the running measurement. Measured calls inside it are recorded on their own."""
+        if not self._depth:
+            return func(*args, **kwargs)
+        depth, excluded_s = self._depth, self._excluded_s
+        self._depth = 0
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            self._depth = depth
+            self._excluded_s = excluded_s + time.perf_counter() - start
+
+    def metered(self, func: Callable) -> Callable:
+        """Adds the time spent in `func` to the current card."""
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs) -> Any:
+            if not self.is_active:
+                return func(*args, **kwargs)
+            return self.measure(func, *args, **kwargs)
+
+        return wrapper
+
+    def reset(self) -> None:
+        self._card_s = 0.0
+        self._window.clear()
+        self._set_shed([])
+
+    def configure(self) -> None:
+        """Start or stop measuring after the budget was changed. Shed features are restored."""
+        reviewer_patches.meter = self if self.is_active else None
+        self.reset()
+
+    def end_card(self, _card: Optional[Card] = None) -> None:
+        """Called when the next card is shown. Closes the measurement of the previous card."""
+        if not self.is_active:
+            return
+        self._window.append(self._card_s)
+        self._card_s = 0.0
+        if len(self._window) < self.window_size:
+            return
+        mean_s = statistics.fmean(self._window)
+        self._window.clear()
+        self._update_cost(mean_s)
+        budget_s = config.performance_budget_ms / 1000
+        if mean_s > budget_s:
+            self._shed_next(mean_s)
+        elif self._shed:
+            self._windows_under_budget += 1
+            expected_s = mean_s + (self._shed[-1].cost_s or 0.0)
+            if expected_s < budget_s * self.restore_ratio or self._windows_under_budget >= self.retry_windows:
+                self._set_shed(self._shed[:-1])
+
+    def _update_cost(self, mean_s: float) -> None:
+        if self._shed and self._shed[-1].cost_s is None:
+            last = self._shed[-1]
+            self._shed[-1] = last._replace(cost_s=max(last.mean_before_s - mean_s, 0.0))
+
+    def _shed_next(self, mean_s: float) -> None:
+        for feature in SHED_ORDER:
+            if self.allows(feature) and is_feature_on(feature):
+                return self._set_shed([*self._shed, ShedFeature(feature, mean_s)])
+
+    def _set_shed(self, shed: list[ShedFeature]) -> None:
+        self._windows_under_budget = 0
+        self._shed = shed
+        self._shed_names = frozenset(self.shed_features)
+
+
+perf_budget = PerformanceBudget()
+
+
+def format_shed_features() -> str:
+    if not perf_budget.has_shed:
+        return ""
+    labels = ", ".join(SHED_LABELS[name] for name in perf_budget.shed_features)
+    return (
+        f'<span class="ajt__perf-shed" title="Turned off to stay within the performance budget">'
+        f"Off: {labels}</span>"
+    )
+
+
+def init() -> None:
+    perf_budget.configure()
+    gui_hooks.reviewer_did_show_question.append(perf_budget.end_card)
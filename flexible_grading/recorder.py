@@ -0,0 +1,94 @@
+# Copyright: Ajatt-Tools and contributors; https://github.com/Ajatt-Tools
+# License: GNU AGPL, version 3 or later; http://www.gnu.org/licenses/agpl.html
+
+import functools
+import gzip
+import json
+import time
+from typing import IO, Any, Callable, Optional
+
+from aqt import gui_hooks
+
+from .config import config
+from .consts import USER_FILES_DIR
+
+TRACE_VERSION = 1
+
+
+class SessionRecorder:
+    """
+    Records the add-on's input events and hook invocations during a review session.
+    Each line of the gzipped trace is a JSON array: [milliseconds since start, nesting depth, event, *args].
+    The first line is a header holding the config the session was recorded with.
+    Nested events (e.g. a hook fired while answering a card) have depth > 0,
+    so that a replayer can feed back only the top-level ones.
+    """
+
+    def __init__(self) -> None:
+        self._file: Optional[IO[str]] = None
+        self._start = 0.0
+        self._depth = 0
+
+    @property
+    def is_recording(self) -> bool:
+        return self._file is not None
+
+    def start(self) -> None:
+        if self.is_recording:
+            return
+        USER_FILES_DIR.mkdir(exist_ok=True)
+        path = USER_FILES_DIR / f"session_{time.strftime('%Y%m%d_%H%M%S')}.jsonl.gz"
+        self._file = gzip.open(path, "wt", encoding="utf8")
+        self._start = time.perf_counter()
+        self._write({"version": TRACE_VERSION, "config": config.as_dict()})
+
+    def stop(self) -> None:
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def record(self, event: str, *args: Any) -> None:
+        if self._file:
+            self._write([round((time.perf_counter() - self._start) * 1000, 3), self._depth, event, *args])
+
+    def _write(self, entry: Any) -> None:
+        assert self._file
+        self._file.write(json.dumps(entry, separators=(",", ":")) + "\n")
+
+    def traced(self, event: str, get_args: Callable[..., tuple]) -> Callable[[Callable], Callable]:
+        """
+        Decorator. Records a call of the decorated function with the arguments returned by get_args.
+        When not recording, the only overhead is a single attribute check.
+        """
+
+        def decorator(func: Callable) -> Callable:
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if self._file is None:
+                    return func(*args, **kwargs)
+                self.record(event, *get_args(*args, **kwargs))
+                self._depth += 1
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self._depth -= 1
+
+            return wrapper
+
+        return decorator
+
+
+session_recorder = SessionRecorder()
+
+
+def on_state_did_change(new_state: str, _old_state: str) -> None:
+    if new_state == "review" and config.record_review_sessions:
+        session_recorder.start()
+
+
+def init() -> None:
+    gui_hooks.state_did_change.append(on_state_did_change)
+    gui_hooks.reviewer_did_show_answer.append(lambda card: session_recorder.record("show_answer"))
+    gui_hooks.state_did_undo.append(lambda changes: session_recorder.record("undo"))
+    gui_hooks.reviewer_will_end.append(session_recorder.stop)
+    gui_hooks.profile_will_close.append(session_recorder.stop)
@@ -2,14 +2,22 @@
 # License: GNU AGPL, version 3 or later; http://www.gnu.org/licenses/agpl.html
 
 import re
+import time
+from collections.abc import Iterable
 from typing import Callable, Optional
 
-from anki.collection import Collection
+from anki.cards import Card
+from anki.collection import Collection, OpChanges
 from anki.consts import REVLOG_RESCHED
-from anki.hooks import wrap
+from anki.decks import DeckId
+from anki.utils import ids2str
+from aqt import gui_hooks, mw
 from aqt.reviewer import Reviewer
 
-from .config import RemainingCountType, config
+from .config import RemainingCountType, RepsDoneTodayScope, config
+from .patching import reviewer_patches
+from .perf_budget import format_shed_features, perf_budget
+from .review_history import format_heatmap, format_streak
 
 HTML_TAG = re.compile(r"<[^<>]+>", flags=re.IGNORECASE | re.MULTILINE)
 
@@ -42,24 +50,120 @@ def prev_day_cutoff_ms(col: Collection) -> int:
     return (col.sched.day_cutoff - 86_400) * 1000
 
 
-def studied_today_count(col: Collection) -> int:
+def studied_today_count(col: Collection, deck_ids: Optional[Iterable[DeckId]] = None) -> int:
+    if deck_ids is None:
+        return col.db.scalar(
+            """ SELECT COUNT(*) FROM revlog WHERE type != ? AND id > ? """,
+            REVLOG_RESCHED,
+            prev_day_cutoff_ms(col),
+        )
+    # Cards in filtered decks are counted in their home deck too.
+    deck_ids_str = ids2str(deck_ids)
     return col.db.scalar(
-        """ SELECT COUNT(*) FROM revlog WHERE type != ? AND id > ? """,
+        f"""
+        SELECT COUNT(*) FROM revlog JOIN cards ON cards.id = revlog.cid
+        WHERE revlog.type != ? AND revlog.id > ?
+        AND (cards.did IN {deck_ids_str} OR cards.odid IN {deck_ids_str})
+        """,
         REVLOG_RESCHED,
         prev_day_cutoff_ms(col),
     )
 
 
+class StudiedTodayCounter:
+    """
+    Number of reviews done today, in the whole collection or in the current deck and its subdecks.
+    Counted with one query when the deck, the scope or the day changes. Answers are then added in memory,
+    so the bottom bar doesn't query the revlog on every card.
+    """
+
+    def __init__(self) -> None:
+        self._count: Optional[int] = None
+        self._scope = RepsDoneTodayScope.collection
+        self._deck_ids: frozenset[DeckId] = frozenset()
+        self._day_cutoff = 0.0
+
+    def invalidate(self, *_args) -> None:
+        self._count = None
+
+    def _is_valid(self) -> bool:
+        return (
+            self._count is not None
+            and self._scope == config.reps_done_today_scope
+            and time.time() < self._day_cutoff
+        )
+
+    def _recount(self, col: Collection) -> int:
+        self._scope = config.reps_done_today_scope
+        self._day_cutoff = col.sched.day_cutoff
+        if self._scope == RepsDoneTodayScope.deck:
+            # The subtree is computed once per deck selection.
+            self._deck_ids = frozenset(col.decks.deck_and_child_ids(col.decks.get_current_id()))
+            self._count = studied_today_count(col, self._deck_ids)
+        else:
+            self._deck_ids = frozenset()
+            self._count = studied_today_count(col)
+        return self._count
+
+    def count(self, col: Collection) -> int:
+        if self._is_valid():
+            assert self._count is not None
+            return self._count
+        return self._recount(col)
+
+    def on_answer(self, _reviewer: Reviewer, card: Card, _ease: int) -> None:
+        if not self._is_valid():
+            return
+        if self._scope == RepsDoneTodayScope.collection or card.did in self._deck_ids or card.odid in self._deck_ids:
+            assert self._count is not None
+            self._count += 1
+
+    def on_operation_did_execute(self, changes: OpChanges, handler: Optional[object]) -> None:
+        # Answers made in the reviewer are already counted. Others, e.g. from the triage grid, need a recount.
+        if mw and handler is mw.reviewer:
+            return
+        if changes.study_queues or changes.deck:
+            self.invalidate()
+
+
+studied_today = StudiedTodayCounter()
+
+
 def format_studied_today(col: Collection) -> str:
-    if not config.show_reps_done_today:
+    if not (config.show_reps_done_today and perf_budget.allows("show_reps_done_today")):
         return ""
-    return f'<span class="ajt__studied-today">Reps: {studied_today_count(col)}</span>'
+    return f'<span class="ajt__studied-today">Reps: {studied_today.count(col)}</span>'
 
 
 def wrap_remaining(self: Reviewer, _old: Callable[[Reviewer], str]) -> str:
-    return format_remaining_cards(self, _old) + format_studied_today(self.mw.col)
+    return (
+        format_remaining_cards(self, _old)
+        + format_studied_today(self.mw.col)
+        + format_streak(self.mw.col)
+        + format_heatmap(self.mw.col)
+        + format_shed_features()
+    )
+
+
+def is_remaining_modified() -> bool:
+    return (
+        config.remaining_count_type != RemainingCountType.default
+        or config.show_reps_done_today
+        or config.show_review_streak
+        or config.show_review_heatmap
+        or perf_budget.has_shed
+    )
 
 
 def init():
-    # noinspection PyProtectedMember
-    Reviewer._remaining = wrap(Reviewer._remaining, wrap_remaining, "around")
+    # _remaining is called several times per card. Skip the patch entirely when it wouldn't change anything.
+    reviewer_patches.register("_remaining", wrap_remaining, is_enabled=is_remaining_modified)
+
+    # Keep the number of reviews done today up to date without querying the revlog on every card.
+    gui_hooks.reviewer_did_answer_card.append(studied_today.on_answer)
+    # The user may have picked another deck.
+    gui_hooks.state_did_change.append(studied_today.invalidate)
+    gui_hooks.state_did_undo.append(studied_today.invalidate)
+    gui_hooks.sync_did_finish.append(studied_today.invalidate)
+    gui_hooks.collection_did_load.append(studied_today.invalidate)
+    gui_hooks.operation_did_execute.append(studied_today.on_operation_did_execute)
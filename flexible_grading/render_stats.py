@@ -0,0 +1,135 @@
+# Copyright: Ajatt-Tools and contributors; https://github.com/Ajatt-Tools
+# License: GNU AGPL, version 3 or later; http://www.gnu.org/licenses/agpl.html
+
+import collections
+import json
+import statistics
+from typing import Any, NamedTuple
+
+from aqt import gui_hooks, mw
+from aqt.qt import *
+from aqt.reviewer import ReviewerBottomBar
+from aqt.utils import restoreGeom, saveGeom
+
+from .ajt_common.consts import ADDON_SERIES
+from .config import config
+from .consts import ADDON_NAME
+
+MESSAGE_PREFIX = "ajt__render_stats:"
+
+
+class RenderStatsSummary(NamedTuple):
+    name: str
+    count: int
+    mean: float
+    median: float
+    p95: float
+    max: float
+
+
+class RenderStats:
+    """In-memory store of the bottom bar render timings reported by the render probe (ajt__render_probe.js)."""
+
+    max_samples: int = 1000
+
+    def __init__(self) -> None:
+        self._samples: dict[str, collections.deque[float]] = {}
+
+    def add(self, name: str, duration_ms: float) -> None:
+        self._samples.setdefault(name, collections.deque(maxlen=self.max_samples)).append(duration_ms)
+
+    def clear(self) -> None:
+        self._samples.clear()
+
+    def summary(self) -> list[RenderStatsSummary]:
+        result = []
+        for name, samples in sorted(self._samples.items()):
+            ordered = sorted(samples)
+            result.append(
+                RenderStatsSummary(
+                    name=name.removeprefix("ajt__"),
+                    count=len(ordered),
+                    mean=statistics.fmean(ordered),
+                    median=statistics.median(ordered),
+                    p95=ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)],
+                    max=ordered[-1],
+                )
+            )
+        return result
+
+
+render_stats = RenderStats()
+
+
+def on_js_message(handled: tuple[bool, Any], message: str, context: Any) -> tuple[bool, Any]:
+    if not (isinstance(context, ReviewerBottomBar) and message.startswith(MESSAGE_PREFIX)):
+        return handled
+    for name, duration_ms in json.loads(message.removeprefix(MESSAGE_PREFIX)):
+        render_stats.add(name, float(duration_ms))
+    return True, None
+
+
+class RenderStatsDialog(QDialog):
+    name = f"{ADDON_SERIES} {ADDON_NAME} Render Stats"
+    _columns = ("Measure", "Count", "Mean, ms", "Median, ms", "95%, ms", "Max, ms")
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.setWindowTitle(f"{ADDON_SERIES} Bottom Bar Render Stats")
+        self.setMinimumSize(560, 240)
+        self._table = QTableWidget(0, len(self._columns))
+        self._table.setHorizontalHeaderLabels(self._columns)
+        self._table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self._button_box = QDialogButtonBox(QDialogButtonBox.StandardButton.Close, parent=self)
+        self._refresh_button = self._button_box.addButton("&Refresh", QDialogButtonBox.ButtonRole.ActionRole)
+        self._clear_button = self._button_box.addButton("C&lear", QDialogButtonBox.ButtonRole.ResetRole)
+        self.setup_layout()
+        self.connect_buttons()
+        self.refresh()
+        restoreGeom(self, self.name)
+
+    def setup_layout(self) -> None:
+        layout = QVBoxLayout(self)
+        layout.addWidget(self._table)
+        if not config.measure_bottom_bar_render:
+            layout.addWidget(QLabel("Enable 'Measure bottom bar render' in the settings to collect samples."))
+        layout.addWidget(self._button_box)
+        self.setLayout(layout)
+
+    def connect_buttons(self) -> None:
+        qconnect(self._refresh_button.clicked, self.refresh)
+        qconnect(self._clear_button.clicked, self.clear)
+        qconnect(self._button_box.rejected, self.reject)
+
+    def refresh(self) -> None:
+        rows = render_stats.summary()
+        self._table.setRowCount(len(rows))
+        for row_idx, row in enumerate(rows):
+            cells = (row.name, str(row.count), *(f"{value:.2f}" for value in row[2:]))
+            for col_idx, text in enumerate(cells):
+                self._table.setItem(row_idx, col_idx, QTableWidgetItem(text))
+        self._table.resizeColumnsToContents()
+
+    def clear(self) -> None:
+        render_stats.clear()
+        self.refresh()
+
+    def done(self, *args, **kwargs) -> None:
+        saveGeom(self, self.name)
+        return super().done(*args, **kwargs)
+
+
+def on_open_render_stats() -> None:
+    assert mw
+    dialog = RenderStatsDialog(mw)
+    dialog.exec()
+
+
+def setup_render_stats_action(parent: QWidget) -> QAction:
+    action = QAction(f"{ADDON_NAME} Render Stats...", parent)
+    qconnect(action.triggered, on_open_render_stats)
+    return action
+
+
+def init() -> None:
+    gui_hooks.webview_did_receive_js_message.append(on_js_message)
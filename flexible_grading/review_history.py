@@ -0,0 +1,247 @@
+# Copyright: Ajatt-Tools and contributors; https://github.com/Ajatt-Tools
+# License: GNU AGPL, version 3 or later; http://www.gnu.org/licenses/agpl.html
+
+import json
+import pathlib
+from typing import Any, Final, Optional
+
+from anki.cards import Card
+from anki.collection import Collection, OpChanges
+from anki.consts import REVLOG_RESCHED
+from aqt import gui_hooks, mw
+from aqt.reviewer import Reviewer
+
+from .analytics import DailyReviewCounts, RevlogStamp, RevlogStampAggregate, analytics_worker
+from .config import config
+from .consts import USER_FILES_DIR
+from .idle_tasks import Priority, idle_scheduler
+from .perf_budget import perf_budget
+
+SECONDS_IN_DAY: Final[int] = 86_400
+HEATMAP_DAYS: Final[int] = 30
+
+
+def day_offset(col: Collection) -> int:
+    """Seconds between midnight UTC and the moment the next Anki day starts."""
+    return col.sched.day_cutoff % SECONDS_IN_DAY
+
+
+def day_number(timestamp_s: int, offset: int) -> int:
+    return (timestamp_s - offset) // SECONDS_IN_DAY
+
+
+def last_revlog_id(col: Collection) -> int:
+    # Revlog ids are primary keys, so this doesn't scan the table.
+    return col.db.scalar("SELECT MAX(id) FROM revlog") or 0
+
+
+class DailyReviews:
+    """
+    Persisted per-day review counts, used to draw the streak and the heatmap without scanning revlog.
+    The table is built once by the analytics worker, off the GUI thread, and then updated incrementally.
+    It is rebuilt only when revlog changed behind our back, e.g. after a sync or an import.
+    Changes are detected by comparing a stamp of revlog, which is also taken on the worker.
+    """
+
+    def __init__(self) -> None:
+        self._counts: dict[int, int] = {}
+        self._offset: Optional[int] = None
+        self._dirty = False
+        # State of revlog that the counts agree with.
+        self._stamp: Optional[RevlogStamp] = None
+        # Results of an older rebuild are dropped if another rebuild was started since.
+        self._rebuild_generation = 0
+
+    @staticmethod
+    def file_path() -> pathlib.Path:
+        assert mw
+        return USER_FILES_DIR / f"daily_reviews_{mw.pm.name}.json"
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._offset is not None
+
+    def today(self, col: Collection) -> int:
+        return day_number(col.sched.day_cutoff - 1, day_offset(col))
+
+    def load(self, col: Collection) -> None:
+        try:
+            with open(self.file_path(), encoding="utf8") as f:
+                data: dict[str, Any] = json.load(f)
+        except (OSError, ValueError):
+            return self.rebuild(col)
+        if data.get("offset") != day_offset(col) or "revlog_count" not in data:
+            return self.rebuild(col)
+        self._counts = {int(day): count for day, count in data["counts"].items()}
+        self._offset = data["offset"]
+        self._stamp = RevlogStamp(data["last_revlog_id"], data["revlog_count"])
+        self._dirty = False
+        # Reviews could have been added or removed while the add-on wasn't watching.
+        self.check_revlog(col)
+
+    def rebuild(self, col: Collection) -> None:
+        """Recount all days in the background. The streak and the heatmap are hidden until it's done."""
+        self._offset = None
+        self._stamp = None
+        self._rebuild_generation += 1
+        generation = self._rebuild_generation
+
+        def on_done(counts: dict[int, int]) -> None:
+            if generation != self._rebuild_generation or not (mw and mw.col):
+                return
+            self._counts = counts
+            self._offset = aggregate.offset
+            self._stamp = aggregate.stamp
+            self._dirty = True
+            # Picks up the answers given while the worker was counting.
+            self.refresh_today(mw.col)
+
+        aggregate = DailyReviewCounts(day_offset(col))
+        analytics_worker.submit(aggregate, on_done)
+
+    def refresh_today(self, col: Collection) -> None:
+        """
+        Recount today's reviews after changes limited to today, e.g. undo or triage.
+        Uses a range over the primary key, so the cost doesn't grow with revlog.
+        """
+        if not self.is_loaded:
+            return
+        if self._offset != day_offset(col):
+            return self.rebuild(col)
+        today = self.today(col)
+        old_count = self._counts.get(today, 0)
+        self._counts[today] = col.db.scalar(
+            """ SELECT COUNT(*) FROM revlog WHERE type != ? AND id > ? """,
+            REVLOG_RESCHED,
+            (col.sched.day_cutoff - SECONDS_IN_DAY) * 1000,
+        )
+        if self._stamp is not None:
+            self._stamp = RevlogStamp(last_revlog_id(col), self._stamp.count + self._counts[today] - old_count)
+        self._dirty = True
+
+    def check_revlog(self, col: Collection) -> None:
+        """Rebuild if revlog was changed by something other than the reviewer. The stamp is taken on the worker."""
+        if not self.is_loaded:
+            return
+        generation = self._rebuild_generation
+
+        def on_done(stamp: RevlogStamp) -> None:
+            if generation == self._rebuild_generation and self.is_loaded and stamp != self._stamp and mw and mw.col:
+                self.rebuild(mw.col)
+
+        analytics_worker.submit(RevlogStampAggregate(), on_done)
+
+    def on_answer(self, reviewer: Reviewer, _card: Card, _ease: int) -> None:
+        if not self.is_loaded:
+            return
+        col = reviewer.mw.col
+        today = self.today(col)
+        self._counts[today] = self._counts.get(today, 0) + 1
+        if self._stamp is not None:
+            self._stamp = RevlogStamp(last_revlog_id(col), self._stamp.count + 1)
+        self._dirty = True
+
+    def save(self) -> None:
+        if not (self.is_loaded and self._dirty and self._stamp and mw):
+            return
+        USER_FILES_DIR.mkdir(exist_ok=True)
+        with open(self.file_path(), "w", encoding="utf8") as f:
+            json.dump(
+                {
+                    "offset": self._offset,
+                    "last_revlog_id": self._stamp.last_id,
+                    "revlog_count": self._stamp.count,
+                    "counts": self._counts,
+                },
+                f,
+                separators=(",", ":"),
+            )
+        self._dirty = False
+
+    def close(self) -> None:
+        self.save()
+        self._counts = {}
+        self._offset = None
+        self._stamp = None
+        self._rebuild_generation += 1
+
+    def streak(self, col: Collection) -> int:
+        """Number of consecutive days with reviews. Today doesn't break the streak until it's over."""
+        day = self.today(col)
+        if not self._counts.get(day):
+            day -= 1
+        streak = 0
+        while self._counts.get(day - streak):
+            streak += 1
+        return streak
+
+    def last_days(self, col: Collection, n_days: int = HEATMAP_DAYS) -> list[int]:
+        """Review counts for the last n days, oldest first."""
+        today = self.today(col)
+        return [self._counts.get(day, 0) for day in range(today - n_days + 1, today + 1)]
+
+
+daily_reviews = DailyReviews()
+
+
+def is_enabled() -> bool:
+    return config.show_review_streak or config.show_review_heatmap
+
+
+def format_streak(col: Collection) -> str:
+    if not (config.show_review_streak and daily_reviews.is_loaded and perf_budget.allows("show_review_streak")):
+        return ""
+    return f'<span class="ajt__review-streak">Streak: {daily_reviews.streak(col)}d</span>'
+
+
+def format_heatmap(col: Collection) -> str:
+    if not (config.show_review_heatmap and daily_reviews.is_loaded and perf_budget.allows("show_review_heatmap")):
+        return ""
+    counts = daily_reviews.last_days(col)
+    max_count = max(counts) or 1
+    color = config.get_label_color("good")
+    cells = "".join(
+        f'<span class="ajt__heatmap-cell" title="{count}" '
+        f'style="background-color: {color}; opacity: {0.1 + 0.9 * count / max_count:.2f};"></span>'
+        for count in counts
+    )
+    return f'<span class="ajt__heatmap">{cells}</span>'
+
+
+def on_collection_did_load(col: Collection) -> None:
+    if is_enabled():
+        daily_reviews.load(col)
+
+
+def on_sync_did_finish() -> None:
+    # Other devices could have added reviews for any day.
+    if is_enabled() and mw and mw.col:
+        daily_reviews.check_revlog(mw.col)
+
+
+def on_operation_did_execute(changes: OpChanges, handler: Optional[object]) -> None:
+    # Answers made in the reviewer are already counted. Others, e.g. imported reviews, need a check.
+    if mw and handler is mw.reviewer:
+        return
+    if (changes.card or changes.study_queues) and mw and mw.col:
+        idle_scheduler.schedule(lambda: daily_reviews.check_revlog(mw.col), key="check_revlog")
+
+
+def on_state_did_undo(_changes) -> None:
+    # Runs before operation_did_execute, so the stamp is already current when the check compares it.
+    if mw and mw.col:
+        daily_reviews.refresh_today(mw.col)
+
+
+def on_reviewer_will_end() -> None:
+    idle_scheduler.schedule(daily_reviews.save, Priority.low, key="save_daily_reviews")
+
+
+def init() -> None:
+    gui_hooks.collection_did_load.append(on_collection_did_load)
+    gui_hooks.sync_did_finish.append(on_sync_did_finish)
+    gui_hooks.operation_did_execute.append(on_operation_did_execute)
+    gui_hooks.reviewer_did_answer_card.append(daily_reviews.on_answer)
+    gui_hooks.state_did_undo.append(on_state_did_undo)
+    gui_hooks.reviewer_will_end.append(on_reviewer_will_end)
+    gui_hooks.profile_will_close.append(daily_reviews.close)
@@ -1,17 +1,64 @@
 # Copyright: Ajatt-Tools and contributors; https://github.com/Ajatt-Tools
 # License: GNU AGPL, version 3 or later; http://www.gnu.org/licenses/agpl.html
 import pathlib
+import re
 from typing import Any, Final, Optional
 
 from aqt import gui_hooks, mw
 from aqt.reviewer import ReviewerBottomBar
 from aqt.webview import WebContent
 
+from .config import config
+
 REVIEWER_CSS_PATH: Final[pathlib.Path] = pathlib.Path(__file__).parent / "web/ajt__reviewer.css"
+RENDER_PROBE_JS_PATH: Final[pathlib.Path] = pathlib.Path(__file__).parent / "web/ajt__render_probe.js"
+STYLE_ELEMENT_ID: Final[str] = "ajt__reviewer_css"
 
 
 # Ensure everything is ok
 assert REVIEWER_CSS_PATH.is_file(), "reviewer CSS must exist"
+assert RENDER_PROBE_JS_PATH.is_file(), "render probe must exist"
+
+
+def minify_css(css: str) -> str:
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.DOTALL)
+    css = re.sub(r"\s+", " ", css)
+    css = re.sub(r"\s*([{};,>])\s*", r"\1", css)
+    css = re.sub(r":\s+", ":", css)
+    return css.replace(";}", "}").strip()
+
+
+class ReviewerStyle:
+    """
+    The add-on's reviewer CSS, minified and kept in memory.
+    The file is read again only when its mtime changes, e.g. while editing it.
+    """
+
+    def __init__(self, path: pathlib.Path) -> None:
+        self._path = path
+        self._mtime_ns: Optional[int] = None
+        self._css = ""
+
+    def _reload_if_changed(self) -> None:
+        mtime_ns = self._path.stat().st_mtime_ns
+        if mtime_ns != self._mtime_ns:
+            self._css = minify_css(self._path.read_text(encoding="utf-8"))
+            self._mtime_ns = mtime_ns
+
+    def as_style_element(self) -> str:
+        self._reload_if_changed()
+        return f'<style id="{STYLE_ELEMENT_ID}">{self._css}</style>'
+
+
+reviewer_style = ReviewerStyle(REVIEWER_CSS_PATH)
+
+
+def render_probe_js(enabled: bool) -> str:
+    """Turns the render probe on or off in a bottom bar that is already loaded."""
+    if enabled:
+        # The probe only re-enables itself if it has been loaded before.
+        return RENDER_PROBE_JS_PATH.read_text(encoding="utf-8")
+    return "if (window.ajt__render_probe) { window.ajt__render_probe.enabled = false; }"
 
 
 def on_webview_will_set_content(web_content: WebContent, context: Optional[Any]) -> None:
@@ -20,11 +67,14 @@ def on_webview_will_set_content(web_content: WebContent, context: Optional[Any])
         return
 
     assert mw
-    addon_package = mw.addonManager.addonFromModule(__name__)
-    web_content.css.append(f"/_addons/{addon_package}/web/ajt__reviewer.css")
+    # Inlined, so that loading the bottom bar doesn't request the file from Anki's media server.
+    web_content.head += reviewer_style.as_style_element()
+    if config.measure_bottom_bar_render:
+        addon_package = mw.addonManager.addonFromModule(__name__)
+        web_content.js.append(f"/_addons/{addon_package}/web/ajt__render_probe.js")
 
 
 def init() -> None:
     assert mw
-    mw.addonManager.setWebExports(__name__, r"web/.+\.(css|js)$")
+    mw.addonManager.setWebExports(__name__, r"web/.+\.js$")
     gui_hooks.webview_will_set_content.append(on_webview_will_set_content)
@@ -1,16 +1,53 @@
 # Copyright: Ren Tatsumoto <tatsu at autistici.org>
 # License: GNU AGPL, version 3 or later; http://www.gnu.org/licenses/agpl.html
 
+import json
 import time
 from gettext import gettext as _
+from typing import Optional
 
-import aqt
-from anki.cards import Card
+from anki.cards import Card, CardId
+from anki.errors import NotFoundError
 from aqt import gui_hooks, mw
 from aqt.reviewer import Reviewer
 from aqt.toolbar import Toolbar
+from aqt.utils import tooltip
 
+from .card_info import LastCardInfoDialog
 from .config import config
+from .idle_tasks import Priority, idle_scheduler
+from .perf_budget import perf_budget
+from .recorder import session_recorder
+
+# Shows the last card's status on the toolbar.
+# Intervals of learning cards are counted down by a JS timer,
+# so that the label stays accurate without any work on the Python side.
+LAST_EASE_UPDATE_JS = """\
+{
+    const elem = document.getElementById(%(link_id)s);
+    clearTimeout(window.ajt__last_ease_timer);
+    elem.style.color = %(color)s;
+    elem.style.display = "inline";
+    const prefix = %(prefix)s;
+    const dueMs = %(due_ms)s;
+    const tick = () => {
+        const minutes = (dueMs - Date.now()) / 60000;
+        if (minutes <= 0) {
+            elem.innerHTML = prefix + "now";
+            return;
+        }
+        const hours = minutes / 60;
+        elem.innerHTML = prefix + (hours >= 1 ? `${hours.toFixed(1)}h` : `${minutes.toFixed(0)}m`);
+        // Minutes change every minute, tenths of an hour change every six minutes.
+        window.ajt__last_ease_timer = setTimeout(tick, hours >= 1 ? 60000 : 10000);
+    };
+    if (dueMs === null) {
+        elem.innerHTML = prefix + %(status)s;
+    } else {
+        tick();
+    }
+};
+"""
 
 
 def handle_due(card: Card) -> str:
@@ -36,6 +73,10 @@ def handle_learn(card: Card) -> str:
         return f"{minutes:.0f}m"
 
 
+def is_learning(card: Card) -> bool:
+    return card.queue == 1 and (card.type == 3 or card.type == 1)
+
+
 def human_ivl(card: Card) -> str:
     # https://github.com/ankidroid/Anki-Android/wiki/Database-Structure
 
@@ -43,7 +84,7 @@ def human_ivl(card: Card) -> str:
         return "buried"
     elif card.queue == -1:
         return "suspended"
-    elif card.queue == 1 and (card.type == 3 or card.type == 1):
+    elif is_learning(card):
         return handle_learn(card)
     elif card.queue == 3 and (card.type == 3 or card.type == 1):
         return "tomorrow"
@@ -58,21 +99,25 @@ def human_ivl(card: Card) -> str:
 class LastEase:
     def __init__(self) -> None:
         self._html_link_id = "last_ease"
-        self._browser_query = ""
+        self._last_card_id: Optional[CardId] = None
         self._last_default_ease = 0
+        self._info_dialog: Optional[LastCardInfoDialog] = None
 
     def set_last_default_ease(self, _: Card) -> None:
         # noinspection PyProtectedMember
         self._last_default_ease = mw.reviewer._defaultEase()
 
     def open_last_card(self) -> None:
-        browser: aqt.browser.Browser = aqt.dialogs.open("Browser", mw)
-        browser.activateWindow()
-        browser.form.searchEdit.lineEdit().setText(self._browser_query)  # search_for
-        if hasattr(browser, "onSearch"):
-            browser.onSearch()
-        else:
-            browser.onSearchActivated()
+        if self._last_card_id is None:
+            return tooltip("No cards have been answered yet.")
+        try:
+            card = mw.col.get_card(self._last_card_id)
+        except NotFoundError:
+            return tooltip("The last card no longer exists.")
+        if self._info_dialog is None:
+            # Created lazily and kept alive, so that the next call only has to refresh the contents.
+            self._info_dialog = LastCardInfoDialog(mw)
+        self._info_dialog.show_card(card, human_ivl(card))
 
     def append_link(self, links: list, toolbar: Toolbar) -> None:
         link = toolbar.create_link(
@@ -84,29 +129,33 @@ class LastEase:
         )
         links.insert(0, link)
 
+    @session_recorder.traced("last_ease_update", lambda self, reviewer, card, ease: (ease,))
+    @perf_budget.metered
     def update(self, reviewer: Reviewer, card: Card, ease: int) -> None:
         """Called after a card was answered."""
         if config.show_last_review is False:
             return
+        if not perf_budget.allows("show_last_review"):
+            return self.hide()
 
         label = config.get_label(ease, self._last_default_ease)
-        color = config.get_label_color(label)
-        status = f"{_(label)[:1]}: {human_ivl(card)}"
-
-        reviewer.mw.toolbar.web.eval("""\
-        {{
-            const elem = document.getElementById("{}");
-            elem.innerHTML = "{}";
-            elem.style.color = "{}";
-            elem.style.display = "inline";
-        }};
-        """.format(self._html_link_id, status, color))
-
-        self._browser_query = f"cid:{card.id}"
+        self._last_card_id = card.id
+        self._eval_deferred(
+            LAST_EASE_UPDATE_JS
+            % {
+                "link_id": json.dumps(self._html_link_id),
+                "color": json.dumps(config.get_label_color(label)),
+                "prefix": json.dumps(f"{_(label)[:1]}: "),
+                # Learning cards are due at a unix timestamp (seconds). Send it once and let JS count down.
+                "due_ms": card.due * 1000 if is_learning(card) else "null",
+                "status": json.dumps(human_ivl(card)),
+            }
+        )
 
     def hide(self, _=None) -> None:
-        mw.toolbar.web.eval("""\
+        self._eval_deferred("""\
         {
+            clearTimeout(window.ajt__last_ease_timer);
             const elem = document.getElementById("%s");
             elem.innerHTML = "";
             elem.style.color = "";
@@ -114,6 +163,11 @@ class LastEase:
         };
         """ % self._html_link_id)
 
+    def _eval_deferred(self, js: str) -> None:
+        # Updating the toolbar is not urgent, let the reviewer show the next card first.
+        # Only the latest update matters, so pending updates are replaced.
+        idle_scheduler.schedule(lambda: mw.toolbar.web.eval(js), Priority.high, key=self._html_link_id)
+
 
 def main() -> None:
     assert mw, "anki should be running"
@@ -0,0 +1,237 @@
+# Copyright: Ajatt-Tools and contributors; https://github.com/Ajatt-Tools
+# License: GNU AGPL, version 3 or later; http://www.gnu.org/licenses/agpl.html
+
+import math
+import time
+from collections.abc import Sequence
+from typing import NamedTuple
+
+from anki.cards import Card, CardId
+from anki.collection import Collection, OpChanges
+from anki.scheduler.v3 import CardAnswer
+from anki.utils import html_to_text_line
+from aqt import mw
+from aqt.operations import CollectionOp
+from aqt.qt import *
+from aqt.utils import restoreGeom, saveGeom, showWarning, tooltip
+
+from .ajt_common.consts import ADDON_SERIES
+from .config import config
+from .consts import ADDON_NAME
+from .review_history import daily_reviews
+
+N_COLUMNS = 4
+FRONT_MAX_CHARS = 120
+HELP_TEXT = "h/j/k/l: move, 1 or x: again, 3 or Space: good, Enter: submit, Esc: cancel"
+
+
+class TriageCard(NamedTuple):
+    card: Card
+    front: str
+
+
+class TriageResult(NamedTuple):
+    answered: int
+    skipped: int
+
+
+def fetch_triage_cards(col: Collection, limit: int) -> list[TriageCard]:
+    """The next due cards of the current deck, in the order the reviewer would show them."""
+    result = []
+    for queued in col.sched.get_queued_cards(fetch_limit=limit).cards:
+        card = Card(col, backend_card=queued.card)
+        # build_answer() reads the card's timer.
+        card.start_timer()
+        front = html_to_text_line(card.question())
+        if len(front) > FRONT_MAX_CHARS:
+            front = front[: FRONT_MAX_CHARS - 1] + "…"
+        result.append(TriageCard(card, front))
+    return result
+
+
+def answer_triaged_cards(col: Collection, grades: dict[CardId, tuple[Card, str]], ms_per_card: int) -> TriageResult:
+    """
+    The backend accepts an answer only for the card at the top of the queue.
+    A card answered "again" may come back before the rest of the batch, e.g. before a learn-ahead card,
+    so the order is taken from the queue, and the batch ends at the first card that isn't part of it.
+    """
+    answered = 0
+    while grades:
+        queued_cards = col.sched.get_queued_cards(fetch_limit=1).cards
+        if not queued_cards or CardId(queued_cards[0].card.id) not in grades:
+            break
+        queued = queued_cards[0]
+        card, grade = grades.pop(CardId(queued.card.id))
+        answer = col.sched.build_answer(
+            card=card,
+            states=queued.states,
+            rating=CardAnswer.AGAIN if grade == "again" else CardAnswer.GOOD,
+        )
+        answer.milliseconds_taken = ms_per_card
+        col.sched.answer_card(answer)
+        answered += 1
+    return TriageResult(answered=answered, skipped=len(grades))
+
+
+def answer_cards_op(
+    parent: QWidget,
+    cards: Sequence[TriageCard],
+    grades: Sequence[str],
+    elapsed_ms: int,
+) -> CollectionOp[OpChanges]:
+    """Answers all cards in one operation, on the background thread. The whole batch is undone at once."""
+    # The time spent in the grid is split evenly between the cards.
+    ms_per_card = elapsed_ms // max(len(cards), 1)
+    pending = {triage_card.card.id: (triage_card.card, grade) for triage_card, grade in zip(cards, grades)}
+    results: list[TriageResult] = []
+
+    def op(col: Collection) -> OpChanges:
+        undo_pos = col.add_custom_undo_entry(f"{ADDON_NAME}: Triage {len(pending)} cards")
+        try:
+            results.append(answer_triaged_cards(col, pending, ms_per_card))
+        finally:
+            # Merged even if an answer failed, so that one Undo reverts what was saved.
+            changes = col.merge_undo_entries(undo_pos)
+        return changes
+
+    return (
+        CollectionOp(parent=parent, op=op)
+        .success(lambda _: on_triage_done(results[0]))
+        .failure(on_triage_failed)
+    )
+
+
+class TriageGrid(QTableWidget):
+    """Fronts of the cards. Each cell is marked "again" or "good". Cards start as "good"."""
+
+    def __init__(self, cards: Sequence[TriageCard], parent=None) -> None:
+        super().__init__(math.ceil(len(cards) / N_COLUMNS), N_COLUMNS, parent)
+        self._grades = ["good"] * len(cards)
+        self.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.setSelectionMode(QAbstractItemView.SelectionMode.SingleSelection)
+        self.setWordWrap(True)
+        self.horizontalHeader().setVisible(False)
+        self.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+        self.verticalHeader().setVisible(False)
+        for idx, triage_card in enumerate(cards):
+            self.setItem(*divmod(idx, N_COLUMNS), QTableWidgetItem(triage_card.front))
+            self._paint(idx)
+        self.resizeRowsToContents()
+        self.setCurrentCell(0, 0)
+        qconnect(self.cellDoubleClicked, lambda row, col: self.toggle(row * N_COLUMNS + col))
+
+    @property
+    def grades(self) -> Sequence[str]:
+        return self._grades
+
+    def _paint(self, idx: int) -> None:
+        item = self.item(*divmod(idx, N_COLUMNS))
+        item.setForeground(QColor(config.get_label_color(self._grades[idx])))
+        item.setToolTip(config.get_label(1 if self._grades[idx] == "again" else 3))
+
+    def current_index(self) -> int:
+        return self.currentRow() * N_COLUMNS + self.currentColumn()
+
+    def move_to(self, idx: int) -> None:
+        idx = max(0, min(idx, len(self._grades) - 1))
+        self.setCurrentCell(*divmod(idx, N_COLUMNS))
+
+    def mark(self, grade: str) -> None:
+        idx = self.current_index()
+        if not 0 <= idx < len(self._grades):
+            # An empty cell in the last row.
+            return
+        self._grades[idx] = grade
+        self._paint(idx)
+        self.move_to(idx + 1)
+
+    def toggle(self, idx: int) -> None:
+        if 0 <= idx < len(self._grades):
+            self._grades[idx] = "good" if self._grades[idx] == "again" else "again"
+            self._paint(idx)
+
+    def keyPressEvent(self, event: QKeyEvent) -> None:
+        # Handled here, because QTableWidget would otherwise jump to items that start with the typed letter.
+        idx, text = self.current_index(), event.text().lower()
+        moves = {"h": idx - 1, "l": idx + 1, "k": idx - N_COLUMNS, "j": idx + N_COLUMNS}
+        if text in moves:
+            self.move_to(moves[text])
+        elif text in ("1", "x"):
+            self.mark("again")
+        elif text in ("3", " "):
+            self.mark("good")
+        else:
+            super().keyPressEvent(event)
+
+
+class TriageDialog(QDialog):
+    name = f"{ADDON_SERIES} {ADDON_NAME} Triage"
+
+    def __init__(self, cards: Sequence[TriageCard], *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.setWindowTitle(f"{ADDON_SERIES} Triage {len(cards)} Cards")
+        self.setMinimumSize(640, 480)
+        self._cards = cards
+        self._started_at = time.monotonic()
+        self._grid = TriageGrid(cards, parent=self)
+        self._button_box = QDialogButtonBox(
+            QDialogButtonBox.StandardButton.Ok | QDialogButtonBox.StandardButton.Cancel, parent=self
+        )
+        self._button_box.button(QDialogButtonBox.StandardButton.Ok).setText("&Submit")
+        self.setup_layout()
+        qconnect(self._button_box.accepted, self.accept)
+        qconnect(self._button_box.rejected, self.reject)
+        restoreGeom(self, self.name)
+
+    def setup_layout(self) -> None:
+        layout = QVBoxLayout(self)
+        layout.addWidget(self._grid)
+        layout.addWidget(QLabel(HELP_TEXT))
+        layout.addWidget(self._button_box)
+        self.setLayout(layout)
+
+    def accept(self) -> None:
+        assert mw
+        elapsed_ms = int((time.monotonic() - self._started_at) * 1000)
+        answer_cards_op(mw, self._cards, self._grid.grades, elapsed_ms).run_in_background()
+        return super().accept()
+
+    def done(self, *args, **kwargs) -> None:
+        saveGeom(self, self.name)
+        return super().done(*args, **kwargs)
+
+
+def refresh_daily_reviews() -> None:
+    # The reviewer didn't see these answers.
+    # Done right away, so that the revlog check that follows the operation finds nothing to rebuild.
+    if mw and mw.col:
+        daily_reviews.refresh_today(mw.col)
+
+
+def on_triage_done(result: TriageResult) -> None:
+    if result.skipped:
+        tooltip(f"Answered {result.answered} cards. {result.skipped} cards were left for the reviewer.")
+    else:
+        tooltip(f"Answered {result.answered} cards.")
+    refresh_daily_reviews()
+
+
+def on_triage_failed(exception: Exception) -> None:
+    showWarning(f"Triage stopped: {exception}\nThe cards answered before the error can be reverted with Undo.")
+    refresh_daily_reviews()
+
+
+def on_open_triage() -> None:
+    assert mw
+    if not mw.col:
+        return
+    cards = fetch_triage_cards(mw.col, config.triage_batch_size)
+    if not cards:
+        return tooltip("No cards are due in the current deck.")
+    TriageDialog(cards, parent=mw).exec()
+
+
+def setup_triage_action(parent: QWidget) -> QAction:
+    action = QAction(f"{ADDON_NAME} Triage...", parent)
+    qconnect(action.triggered, on_open_triage)
+    return action
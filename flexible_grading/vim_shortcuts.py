@@ -1,21 +1,145 @@
 # Copyright: Ren Tatsumoto <tatsu at autistici.org>
 # License: GNU AGPL, version 3 or later; http://www.gnu.org/licenses/agpl.html
 import functools
+import time
 from collections.abc import Iterable
-from typing import Callable, Literal, cast
+from typing import Callable, Literal, Optional, cast
 
-from anki.hooks import wrap
+from anki.cards import CardId
 from aqt import gui_hooks, mw
 from aqt.main import MainWindowState
+from aqt.qt import QTimer, qconnect
 from aqt.reviewer import Reviewer
 
 from .config import config
-from .top_toolbar import LastEase
+from .deck_profiles import deck_profiles
+from .idle_tasks import idle_scheduler
+from .patching import reviewer_patches
+from .recorder import session_recorder
 
 
+class KeySequenceParser:
+    """
+    Remembers a count typed before a scroll key, e.g. '5' 'Shift+J', and the last grade for the repeat key.
+    A count that isn't followed by a scroll key within `timeout_s` is dropped.
+    Grading keys only store the grade, so single-key grading doesn't get any slower.
+    """
+
+    timeout_s: float = 1.0
+    max_count: int = 99
+
+    def __init__(self) -> None:
+        self._count = 0
+        self._deadline = 0.0
+        self.last_grade: Optional[str] = None
+
+    @property
+    def is_counting(self) -> bool:
+        return self._count > 0 and time.monotonic() < self._deadline
+
+    def push_digit(self, digit: int) -> None:
+        count = self._count * 10 + digit if self.is_counting else digit
+        self._count = min(count, self.max_count)
+        self._deadline = time.monotonic() + self.timeout_s
+
+    def take_count(self) -> int:
+        count = self._count if self.is_counting else 1
+        self._count = 0
+        return count
+
+    def remember_grade(self, grade: str) -> None:
+        self.last_grade = grade
+        self._count = 0
+
+    def reset(self) -> None:
+        self._count = 0
+        self.last_grade = None
+
+
+key_parser = KeySequenceParser()
+
+
+class FlipAndGrade:
+    """
+    Delays the flip caused by an answer key by `flip_and_grade_window_ms`.
+    If the same key is pressed again in the meantime, the card is graded without rendering its back side.
+    """
+
+    def __init__(self) -> None:
+        self._timer: Optional[QTimer] = None
+        self._reviewer: Optional[Reviewer] = None
+        self._grade: Optional[str] = None
+        self._card_id: Optional[CardId] = None
+
+    def _is_pending(self, reviewer: Reviewer, grade: str) -> bool:
+        return (
+            self._timer is not None
+            and self._timer.isActive()
+            and self._grade == grade
+            and reviewer.card is not None
+            and reviewer.card.id == self._card_id
+        )
+
+    def press(self, reviewer: Reviewer, grade: str) -> None:
+        if self._is_pending(reviewer, grade):
+            self.cancel()
+            return grade_from_front(reviewer, grade)
+        if self._timer is None:
+            assert mw
+            self._timer = QTimer(mw)
+            self._timer.setSingleShot(True)
+            qconnect(self._timer.timeout, self._flip)
+        self._reviewer, self._grade, self._card_id = reviewer, grade, reviewer.card.id
+        self._timer.start(config.flip_and_grade_window_ms)
+
+    def cancel(self) -> None:
+        if self._timer is not None:
+            self._timer.stop()
+        self._reviewer = self._grade = self._card_id = None
+
+    def _flip(self) -> None:
+        reviewer, card_id = self._reviewer, self._card_id
+        self.cancel()
+        if reviewer and reviewer.state == "question" and reviewer.card and reviewer.card.id == card_id:
+            reviewer._getTypedAnswer()
+
+
+flip_and_grade = FlipAndGrade()
+
+
+def grade_from_front(self: Reviewer, grade: str) -> None:
+    """Answer the card without showing its back side. The typed answer is still read if the card has one."""
+    if not deck_profiles.for_card(self.card).flexible_grading:
+        # The deck requires looking at the back side first.
+        return self._getTypedAnswer()
+    card_id = self.card.id
+
+    def on_typed_answer(typed_answer: Optional[str]) -> None:
+        if self.state != "question" or self.card is None or self.card.id != card_id:
+            return
+        self.typedAnswer = typed_answer or ""
+        self.state = "answer"
+        answer_card(self, grade=grade)
+
+    if self.typeCorrect:
+        self.web.evalWithCallback("getTypedAnswer();", on_typed_answer)
+    else:
+        on_typed_answer(None)
+
+
+@session_recorder.traced("answer_card", lambda self, grade: (grade, self.state))
 def answer_card(self: Reviewer, grade: str):
+    idle_scheduler.note_activity()
+    profile = deck_profiles.for_card(self.card)
+    if grade not in profile.answer_buttons:
+        # The key is bound because another deck uses it, e.g. 'Hard' outside of PassFail mode.
+        return
+    key_parser.remember_grade(grade)
     try:
         if self.state == "question" and grade and config["press_answer_key_to_flip_card"] is True:
+            if config.flip_and_grade_window_ms > 0 and profile.flexible_grading:
+                # Grading from the front side is only allowed where flexible grading is on.
+                return flip_and_grade.press(self, grade)
             return self._getTypedAnswer()
         if grade == "again":
             return self._answerCard(1)
@@ -29,31 +153,58 @@ def answer_card(self: Reviewer, grade: str):
         raise RuntimeError("Flexible grading error: Couldn't answer card due to a bug in Anki.") from e
 
 
+def repeat_last_grade(self: Reviewer) -> None:
+    if key_parser.last_grade:
+        answer_card(self, grade=key_parser.last_grade)
+
+
+NUMBER_KEYS = {"again": "1", "hard": "2", "good": "3", "easy": "4"}
+
+
 def enabled_answer_buttons() -> Iterable[str]:
     # In PassFail mode pressing 'Hard' and 'Easy' is not allowed.
-    return ("again", "good") if config["pass_fail"] is True else ("again", "hard", "good", "easy")
+    # Decks may differ, so keys are bound for every answer allowed in any deck.
+    return deck_profiles.answer_buttons_anywhere()
 
 
 def enabled_number_keys() -> Iterable[str]:
-    # In PassFail mode pressing 'Hard' and 'Easy' is not allowed.
-    return ("1", "3") if config["pass_fail"] is True else ("1", "2", "3", "4")
+    return tuple(NUMBER_KEYS[answer] for answer in enabled_answer_buttons())
+
+
+def press_number_key(self: Reviewer, key: str, grade: str) -> None:
+    if key_parser.is_counting:
+        # The digit continues a count, e.g. '1' '2' 'Shift+J'.
+        return key_parser.push_digit(int(key))
+    answer_card(self, grade=grade)
 
 
 def number_shortcuts(self: Reviewer) -> list[tuple[str, Callable]]:
     return [
-        (key, func)
-        for key, func in [
-            ("1", lambda: answer_card(self, grade="again")),
-            ("2", lambda: answer_card(self, grade="hard")),
-            ("3", lambda: answer_card(self, grade="good")),
-            ("4", lambda: answer_card(self, grade="easy")),
-        ]
+        (key, functools.partial(press_number_key, self, key=key, grade=grade))
+        for grade, key in NUMBER_KEYS.items()
         if key in enabled_number_keys()
     ]
 
 
+def count_shortcuts() -> list[tuple[str, Callable]]:
+    """Digits that don't grade cards start a count."""
+    if not config.enable_count_prefix:
+        return []
+    return [
+        (str(digit), functools.partial(key_parser.push_digit, digit))
+        for digit in range(10)
+        if str(digit) not in enabled_number_keys()
+    ]
+
+
 def scroll_webpage(self: Reviewer, amount_hor: int = 0, amount_vert: int = 0) -> None:
-    self.web.eval(f"  window.scrollBy({amount_hor}, {amount_vert});  ")
+    if (count := key_parser.take_count()) > 1:
+        # One smooth motion instead of several jumps.
+        self.web.eval(
+            f"  window.scrollBy({{ left: {amount_hor * count}, top: {amount_vert * count}, behavior: 'smooth' }});  "
+        )
+    else:
+        self.web.eval(f"  window.scrollBy({amount_hor}, {amount_vert});  ")
 
 
 def scroll_shortcuts(self: Reviewer) -> list[tuple[str, Callable]]:
@@ -73,7 +224,9 @@ def new_shortcuts(self: Reviewer) -> list[tuple[str, Callable]]:
             for answer in enabled_answer_buttons()
         ],
         (config.get_key("undo"), self.mw.undo),
-        (config.get_key("last_card"), LastEase.open_last_card),
+        (config.get_key("last_card"), self.mw.ajt__flexible_grading__last_ease.open_last_card),
+        (config.get_key("repeat"), functools.partial(repeat_last_grade, self)),
+        *count_shortcuts(),
         *scroll_shortcuts(self),
     ]
 
@@ -97,6 +250,7 @@ def add_vim_shortcuts(state: MainWindowState, shortcuts: list[tuple[str, Callabl
     if state != "review":
         return
     assert mw
+    key_parser.reset()
     # Reviewer shortcuts are defined in Reviewer._shortcutKeys
     default_shortcuts = shortcuts.copy()
     shortcuts.clear()
@@ -108,10 +262,12 @@ def add_vim_shortcuts(state: MainWindowState, shortcuts: list[tuple[str, Callabl
     )
 
 
+@session_recorder.traced("activate_vim_keys", lambda self, ease, _old: (ease, self.state))
 def activate_vim_keys(self: Reviewer, ease: Literal[1, 2, 3, 4], _old: Callable) -> None:
     # Allows answering from the front side.
     # Reviewer._answerCard() is called when pressing default and configured keys.
-    if config["flexible_grading"] is True and self.state == "question":
+    idle_scheduler.note_activity()
+    if deck_profiles.for_card(self.card).flexible_grading is True and self.state == "question":
         self.state = "answer"
 
     # min() makes sure the original _answerCard() never skips
@@ -120,8 +276,7 @@ def activate_vim_keys(self: Reviewer, ease: Literal[1, 2, 3, 4], _old: Callable)
 
 def main():
     # Add vim answer shortcuts
-    gui_hooks.state_shortcuts_will_change.append(add_vim_shortcuts)
+    reviewer_patches.register_hook(gui_hooks.state_shortcuts_will_change, add_vim_shortcuts)
 
     # Activate Vim shortcuts on the front side, if enabled by the user.
-    # noinspection PyProtectedMember
-    Reviewer._answerCard = wrap(Reviewer._answerCard, activate_vim_keys, "around")
+    reviewer_patches.register("_answerCard", activate_vim_keys)
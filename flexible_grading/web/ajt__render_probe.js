@@ -0,0 +1,96 @@
+/*
+ * AJT Flexible Grading render probe
+ * Copyright: Ajatt-Tools and contributors; https://github.com/Ajatt-Tools
+ * License: GNU AGPL, version 3 or later; https://www.gnu.org/licenses/agpl-3.0.html
+ *
+ * Measures how long the bottom bar takes to update its answer buttons
+ * and sends the samples to Python in batches.
+ */
+
+(() => {
+    "use strict";
+
+    if (window.ajt__render_probe) {
+        // Loaded again after the option was turned back on.
+        window.ajt__render_probe.enabled = true;
+        return;
+    }
+    const probe = (window.ajt__render_probe = { enabled: true });
+    const MESSAGE_PREFIX = "ajt__render_stats:";
+    const BATCH_SIZE = 20;
+    const FLUSH_DELAY_MS = 5000;
+    let samples = [];
+    let flushTimer = null;
+
+    function flush() {
+        clearTimeout(flushTimer);
+        flushTimer = null;
+        if (samples.length > 0) {
+            pycmd(MESSAGE_PREFIX + JSON.stringify(samples));
+            samples = [];
+        }
+    }
+
+    function addSample(name, duration) {
+        samples.push([name, Math.round(duration * 1000) / 1000]);
+        if (samples.length >= BATCH_SIZE) {
+            flush();
+        } else if (flushTimer === null) {
+            flushTimer = setTimeout(flush, FLUSH_DELAY_MS);
+        }
+    }
+
+    const observer = new PerformanceObserver((list) => {
+        for (const entry of list.getEntries()) {
+            if (entry.name.startsWith("ajt__")) {
+                addSample(entry.name, entry.duration);
+                performance.clearMeasures(entry.name);
+            }
+        }
+    });
+    observer.observe({ entryTypes: ["measure"] });
+
+    function updatedElement() {
+        return document.querySelector(".ajt__ease_row") || document.querySelector(".ajt__innertable");
+    }
+
+    function measureUpdate(name, update) {
+        const start = `${name}:start`;
+        const layoutDone = `${name}:layout`;
+        performance.mark(start);
+        const result = update();
+        // Reading the size forces the browser to lay out the new content right now.
+        updatedElement()?.offsetHeight;
+        performance.mark(layoutDone);
+        performance.measure(`${name}:script+layout`, start, layoutDone);
+        // The second frame starts after the first one has been painted.
+        requestAnimationFrame(() =>
+            requestAnimationFrame(() => {
+                performance.measure(`${name}:paint`, layoutDone);
+                performance.clearMarks(start);
+                performance.clearMarks(layoutDone);
+            })
+        );
+        return result;
+    }
+
+    function wrap(funcName) {
+        const original = window[funcName];
+        if (typeof original !== "function") {
+            return;
+        }
+        window[funcName] = function (...args) {
+            if (!probe.enabled) {
+                return original.apply(this, args);
+            }
+            return measureUpdate(`ajt__${funcName}`, () => original.apply(this, args));
+        };
+    }
+
+    wrap("showAnswer");
+    wrap("showQuestion");
+
+    // Initial layout of the bottom bar (Anki's 'innertable').
+    window.addEventListener("load", () => measureUpdate("ajt__initial_layout", () => null));
+    window.addEventListener("pagehide", flush);
+})();
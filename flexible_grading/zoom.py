@@ -8,6 +8,8 @@ from aqt.qt import *
 from aqt.utils import tooltip
 
 from .config import config
+from .idle_tasks import Priority, idle_scheduler
+from .recorder import session_recorder
 
 
 def relevant_states() -> tuple[str, ...]:
@@ -29,6 +31,7 @@ def remove_zoom_shortcuts():
     mw.form.actionZoomOut.setShortcuts([])
 
 
+@session_recorder.traced("zoom", lambda state, factor: (state, factor))
 def set_zoom_factor(state: str, factor: float):
     mw.web.setZoomFactor(factor)
     config.set_zoom_state(state, round(factor, 2))
@@ -36,6 +39,7 @@ def set_zoom_factor(state: str, factor: float):
         tooltip(f"{state.capitalize()} zoom: {mw.web.zoomFactor() * 100:.0f}%", period=1000)
 
 
+@session_recorder.traced("state_change", lambda new_state, old_state: (new_state, old_state))
 def on_state_change(new_state: Optional[str], _old_state: Optional[str]) -> None:
     if config["set_zoom_shortcuts"]:
         set_zoom_shortcuts()
@@ -43,7 +47,8 @@ def on_state_change(new_state: Optional[str], _old_state: Optional[str]) -> None
         remove_zoom_shortcuts()
 
     if config["remember_zoom_level"] and new_state in relevant_states():
-        config.write_config()  # Write previously set values
+        # Write previously set values when the user isn't busy.
+        idle_scheduler.schedule(config.write_config, Priority.low, key="write_config")
         saved_factor = config.get_zoom_state(new_state)
         if mw.web.zoomFactor() != saved_factor:
             set_zoom_factor(new_state, saved_factor)
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# Copyright: Ajatt-Tools and contributors; https://github.com/Ajatt-Tools
+# License: GNU AGPL, version 3 or later; http://www.gnu.org/licenses/agpl.html
+
+"""
+Replays a review session recorded with the `record_review_sessions` option
+against stand-in Anki objects and reports the add-on's processing time per event.
+
+Usage: python scripts/replay_session.py user_files/session_20240101_120000.jsonl.gz [--realtime]
+"""
+
+import argparse
+import gzip
+import json
+import pathlib
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Any, Callable, Optional
+
+import standins
+
+Action = Callable[[], Any]
+
+
+def read_trace(path: pathlib.Path) -> tuple[dict[str, Any], list[list[Any]]]:
+    with gzip.open(path, "rt", encoding="utf8") as f:
+        header = json.loads(f.readline())
+        events = [json.loads(line) for line in f if line.strip()]
+    return header, events
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+class SessionReplayer:
+    def __init__(self, header: dict[str, Any], realtime: bool) -> None:
+        # Don't record the replay itself.
+        self._mw = standins.install({**header["config"], "record_review_sessions": False})
+        self._addon = standins.load_addon()
+        self._addon.review_history.USER_FILES_DIR = pathlib.Path(tempfile.mkdtemp())
+        self._realtime = realtime
+        self._timings: dict[str, list[float]] = defaultdict(list)
+        standins.gui_hooks.collection_did_load(self._mw.col)
+        self._mw.moveToState("review")
+
+    @property
+    def reviewer(self) -> standins.Reviewer:
+        return self._mw.reviewer
+
+    def ensure_state(self, state: Optional[str]) -> None:
+        """Bring the stand-in reviewer to the side of the card the event was recorded on."""
+        if self._mw.state != "review":
+            self._mw.moveToState("review")
+        if state == "answer" and self.reviewer.state == "question":
+            self.reviewer._showAnswer()
+
+    def prepare(self, event: str, args: list[Any]) -> Optional[Action]:
+        """Returns the action to be timed, or None if the event can't be replayed."""
+        if event == "answer_card":
+            grade, state = args
+            self.ensure_state(state)
+            return lambda: self._addon.vim_shortcuts.answer_card(self.reviewer, grade)
+        if event == "activate_vim_keys":
+            ease, state = args
+            self.ensure_state(state)
+            return lambda: self.reviewer._answerCard(ease)
+        if event == "show_answer":
+            self.ensure_state("question")
+            return self.reviewer._showAnswer
+        if event == "undo":
+            return self._mw.undo
+        if event == "zoom":
+            state, factor = args
+            return lambda: self._addon.zoom.set_zoom_factor(state, factor)
+        if event == "state_change":
+            new_state, _old_state = args
+            return (lambda: self._mw.moveToState(new_state)) if new_state else None
+        if event == "last_ease_update":
+            (ease,) = args
+            return lambda: self._mw.ajt__flexible_grading__last_ease.update(self.reviewer, self.reviewer.card, ease)
+        return None
+
+    def timed(self, name: str, action: Action) -> None:
+        start = time.perf_counter()
+        action()
+        self._timings[name].append(time.perf_counter() - start)
+
+    def replay(self, events: list[list[Any]]) -> None:
+        prev_ms = 0.0
+        for timestamp_ms, depth, event, *args in events:
+            if depth > 0:
+                # Nested events are replayed by the top-level event that caused them.
+                continue
+            if self._realtime:
+                time.sleep(max(timestamp_ms - prev_ms, 0) / 1000)
+                prev_ms = timestamp_ms
+            if action := self.prepare(event, args):
+                self.timed(event, action)
+            self.timed("idle_tasks", self._addon.idle_tasks.idle_scheduler.run_pending)
+        self.timed("idle_tasks", self._addon.idle_tasks.idle_scheduler.flush)
+
+    def report(self) -> None:
+        print(f"{'event':<20}{'count':>8}{'mean ms':>10}{'p95 ms':>10}{'max ms':>10}{'total ms':>12}")
+        for name, timings in sorted(self._timings.items()):
+            ms = [t * 1000 for t in timings]
+            print(
+                f"{name:<20}{len(ms):>8}{statistics.fmean(ms):>10.3f}"
+                f"{percentile(ms, 0.95):>10.3f}{max(ms):>10.3f}{sum(ms):>12.1f}"
+            )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("trace", type=pathlib.Path, help="session file saved in the add-on's user_files")
+    parser.add_argument("--realtime", action="store_true", help="keep the recorded pauses between events")
+    args = parser.parse_args()
+
+    header, events = read_trace(args.trace)
+    if header.get("version") != 1:
+        raise SystemExit(f"Unsupported trace version: {header.get('version')}")
+    replayer = SessionReplayer(header, realtime=args.realtime)
+    replayer.replay(events)
+    replayer.report()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+# Copyright: Ajatt-Tools and contributors; https://github.com/Ajatt-Tools
+# License: GNU AGPL, version 3 or later; http://www.gnu.org/licenses/agpl.html
+
+"""
+Headless soak test. Drives the add-on through a long simulated review session
+with stand-in Anki objects and fails if memory, object counts, hook registrations
+or per-card latency keep growing.
+
+Usage: python scripts/soak_test.py [--answers 20000]
+Pass --without-patches to measure the same session without the add-on's Reviewer patches.
+"""
+
+import argparse
+import gc
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import Counter
+from typing import Callable
+
+import standins
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--answers", type=int, default=20_000, help="number of simulated answers")
+    parser.add_argument("--warmup", type=int, default=1_000, help="answers before the baseline is taken")
+    parser.add_argument("--window", type=int, default=1_000, help="answers per latency window")
+    parser.add_argument("--state-change-every", type=int, default=50)
+    parser.add_argument("--zoom-every", type=int, default=25)
+    parser.add_argument("--undo-every", type=int, default=40)
+    parser.add_argument("--max-memory-growth-kb", type=float, default=256.0)
+    parser.add_argument("--max-object-growth", type=int, default=1_000)
+    parser.add_argument("--max-latency-drift", type=float, default=1.5, help="last window mean / first window mean")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--without-patches",
+        action="store_true",
+        help="remove the add-on's Reviewer patches before the run, to get a baseline for the latency",
+    )
+    return parser.parse_args()
+
+
+def count_objects() -> Counter[str]:
+    gc.collect()
+    return Counter(type(obj).__qualname__ for obj in gc.get_objects())
+
+
+def addon_memory(snapshot: tracemalloc.Snapshot) -> tracemalloc.Snapshot:
+    return snapshot.filter_traces([tracemalloc.Filter(True, f"{standins.ADDON_DIR}/*")])
+
+
+class SoakSession:
+    def __init__(self, args: argparse.Namespace) -> None:
+        self._args = args
+        self._rng = random.Random(args.seed)
+        self._mw = standins.install()
+        self._addon = standins.load_addon()
+        self._addon.review_history.USER_FILES_DIR = standins.pathlib.Path(tempfile.mkdtemp())
+        if args.without_patches:
+            for method_name in self._addon.patching.reviewer_patches.uninstall():
+                print(f"Couldn't remove the patch of {method_name}, it has been wrapped again.")
+        self._latencies: list[float] = []
+        standins.gui_hooks.collection_did_load(self._mw.col)
+        self._mw.moveToState("review")
+
+    def grade_keys(self) -> list[str]:
+        if self._args.without_patches:
+            # Anki's own answer keys.
+            return ["1", "2", "3", "4"]
+        config = self._addon.vim_shortcuts.config
+        return [config.get_key(answer) for answer in self._addon.vim_shortcuts.enabled_answer_buttons()]
+
+    def press(self, key: str) -> None:
+        shortcut: Callable = self._mw.state_shortcuts[key]
+        shortcut()
+
+    def step(self, n: int) -> None:
+        args = self._args
+        start = time.perf_counter()
+        if self._mw.reviewer.state == "question" and self._rng.random() < 0.5:
+            self.press(" ")
+        self.press(self._rng.choice(self.grade_keys()))
+        self._addon.idle_tasks.idle_scheduler.run_pending()
+        self._mw.taskman.run_pending_on_main()
+        self._latencies.append(time.perf_counter() - start)
+
+        if n % args.state_change_every == 0:
+            self._mw.moveToState("overview")
+            self._mw.moveToState("review")
+        if n % args.zoom_every == 0:
+            self._addon.zoom.set_zoom_factor(self._mw.state, self._rng.choice((0.9, 1.0, 1.1, 1.2)))
+        if n % args.undo_every == 0:
+            self._mw.undo()
+
+    def run(self) -> int:
+        args = self._args
+        for n in range(1, args.warmup + 1):
+            self.step(n)
+        self._addon.idle_tasks.idle_scheduler.flush()
+
+        hooks_before = standins.gui_hooks.counts()
+        objects_before = count_objects()
+        tracemalloc.start()
+        memory_before = addon_memory(tracemalloc.take_snapshot())
+        first_window = len(self._latencies)
+
+        for n in range(args.warmup + 1, args.answers + 1):
+            self.step(n)
+        self._addon.idle_tasks.idle_scheduler.flush()
+
+        memory_diff = addon_memory(tracemalloc.take_snapshot()).compare_to(memory_before, "lineno")
+        memory_growth_kb = sum(stat.size_diff for stat in memory_diff) / 1024
+        # Snapshots hold a tuple per trace. Release them before counting objects.
+        del memory_before, memory_diff[5:]
+        tracemalloc.stop()
+        objects_after = count_objects()
+        hooks_after = standins.gui_hooks.counts()
+
+        return self.report(
+            memory_growth_kb=memory_growth_kb,
+            memory_diff=memory_diff,
+            object_growth=objects_after - objects_before,
+            hook_growth={
+                name: hooks_after[name] - hooks_before.get(name, 0)
+                for name in hooks_after
+                if hooks_after[name] != hooks_before.get(name, 0)
+            },
+            first_latencies=self._latencies[first_window : first_window + args.window],
+            last_latencies=self._latencies[-args.window :],
+        )
+
+    def report(
+        self,
+        memory_growth_kb: float,
+        memory_diff: list[tracemalloc.StatisticDiff],
+        object_growth: Counter[str],
+        hook_growth: dict[str, int],
+        first_latencies: list[float],
+        last_latencies: list[float],
+    ) -> int:
+        args = self._args
+        failures = []
+
+        print(f"Add-on memory growth: {memory_growth_kb:.1f} KiB")
+        for stat in memory_diff:
+            print(f"  {stat}")
+        if memory_growth_kb > args.max_memory_growth_kb:
+            failures.append(f"memory grew by {memory_growth_kb:.1f} KiB")
+
+        total_object_growth = sum(object_growth.values())
+        print(f"Object growth: {total_object_growth}")
+        for type_name, growth in object_growth.most_common(5):
+            print(f"  {type_name}: +{growth}")
+        if total_object_growth > args.max_object_growth:
+            failures.append(f"{total_object_growth} objects were never released")
+
+        print(f"Hook registrations added during the session: {hook_growth or 'none'}")
+        if hook_growth:
+            failures.append(f"hooks were registered again: {', '.join(hook_growth)}")
+
+        first_ms, last_ms = (statistics.fmean(window) * 1000 for window in (first_latencies, last_latencies))
+        drift = last_ms / first_ms if first_ms else 1.0
+        print(f"Per-card latency: first window {first_ms:.3f} ms, last window {last_ms:.3f} ms, drift {drift:.2f}x")
+        if drift > args.max_latency_drift:
+            failures.append(f"per-card latency drifted by {drift:.2f}x")
+
+        for failure in failures:
+            print(f"FAIL: {failure}", file=sys.stderr)
+        if not failures:
+            print("OK")
+        return 1 if failures else 0
+
+
+def main() -> int:
+    args = parse_args()
+    if args.answers <= args.warmup + args.window:
+        raise SystemExit("--answers must be larger than --warmup plus --window")
+    return SoakSession(args).run()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,652 @@
+# Copyright: Ajatt-Tools and contributors; https://github.com/Ajatt-Tools
+# License: GNU AGPL, version 3 or later; http://www.gnu.org/licenses/agpl.html
+
+"""
+Stand-in Anki objects for running the add-on headless, outside of Anki.
+Only the parts of anki and aqt that the add-on touches are provided.
+The collection is backed by an in-memory SQLite database with Anki's revlog and cards tables,
+so that the add-on's queries run for real.
+"""
+
+import collections
+import copy
+import importlib
+import json
+import pathlib
+import re
+import sqlite3
+import sys
+import threading
+import time
+import types
+from collections.abc import Iterable
+from typing import Any, Callable, NewType, Optional
+
+ROOT_DIR = pathlib.Path(__file__).resolve().parent.parent
+ADDON_DIR = ROOT_DIR / "flexible_grading"
+ADDON_PACKAGE = "flexible_grading"
+
+# Add-on modules initialized the same way __init__.py does it, minus the settings menu.
+ADDON_INIT_SEQUENCE = (
+    ("styling", "init"),
+    ("deck_profiles", "init"),
+    ("top_toolbar", "main"),
+    ("bottom_toolbar", "main"),
+    ("vim_shortcuts", "main"),
+    ("zoom", "init"),
+    ("remaining", "init"),
+    ("recorder", "init"),
+    ("render_stats", "init"),
+    ("perf_budget", "init"),
+    ("patching", "reviewer_patches.install"),
+    ("review_history", "init"),
+    ("analytics", "init"),
+    ("idle_tasks", "init"),
+)
+
+QT_NAMES = (
+    "QAbstractItemView",
+    "QAction",
+    "QCheckBox",
+    "QComboBox",
+    "QDialog",
+    "QDialogButtonBox",
+    "QFormLayout",
+    "QGridLayout",
+    "QGroupBox",
+    "QHBoxLayout",
+    "QKeySequence",
+    "QLabel",
+    "QLayout",
+    "QLineEdit",
+    "QPushButton",
+    "QShortcut",
+    "QSpinBox",
+    "QTableWidget",
+    "QTableWidgetItem",
+    "QTextBrowser",
+    "QTimer",
+    "QVBoxLayout",
+    "QWidget",
+    "Qt",
+)
+
+# Hooks that pass their first argument through every callback.
+FILTER_HOOKS = frozenset(
+    (
+        "reviewer_will_init_answer_buttons",
+        "webview_did_receive_js_message",
+    )
+)
+
+
+class QtStandInMeta(type):
+    def __getattr__(cls, name: str) -> "QtStandIn":
+        return QtStandIn()
+
+
+class QtStandIn(metaclass=QtStandInMeta):
+    """Accepts any call and attribute access. Used for widgets, which are never shown."""
+
+    def __init__(self, *args, **kwargs) -> None:
+        pass
+
+    def __getattr__(self, name: str) -> "QtStandIn":
+        return QtStandIn()
+
+    def __call__(self, *args, **kwargs) -> "QtStandIn":
+        return QtStandIn()
+
+    def __bool__(self) -> bool:
+        return False
+
+    def __or__(self, other: Any) -> "QtStandIn":
+        return self
+
+
+class Hook:
+    def __init__(self, name: str) -> None:
+        self._name = name
+        self._callbacks: list[Callable] = []
+
+    def append(self, callback: Callable) -> None:
+        self._callbacks.append(callback)
+
+    def remove(self, callback: Callable) -> None:
+        if callback in self._callbacks:
+            self._callbacks.remove(callback)
+
+    def count(self) -> int:
+        return len(self._callbacks)
+
+    def __call__(self, *args) -> Any:
+        if self._name in FILTER_HOOKS:
+            value, *rest = args
+            for callback in self._callbacks:
+                value = callback(value, *rest)
+            return value
+        for callback in self._callbacks:
+            callback(*args)
+        return None
+
+
+class GuiHooks(types.ModuleType):
+    def __getattr__(self, name: str) -> Hook:
+        if name.startswith("__"):
+            raise AttributeError(name)
+        hook = Hook(name)
+        setattr(self, name, hook)
+        return hook
+
+    def counts(self) -> dict[str, int]:
+        return {name: hook.count() for name, hook in vars(self).items() if isinstance(hook, Hook)}
+
+
+class WebView:
+    def __init__(self) -> None:
+        self.n_evals = 0
+        self._zoom = 1.0
+
+    def eval(self, js: str) -> None:
+        self.n_evals += 1
+
+    def evalWithCallback(self, js: str, callback: Callable[[Any], None]) -> None:
+        self.n_evals += 1
+        callback(None)
+
+    def adjustHeightToFit(self) -> None:
+        pass
+
+    def zoomFactor(self) -> float:
+        return self._zoom
+
+    def setZoomFactor(self, factor: float) -> None:
+        self._zoom = factor
+
+
+class Note:
+    def __init__(self, nid: int) -> None:
+        self.id = nid
+        self._fields = {"Front": f"<b>front {nid}</b>", "Back": f"back {nid}"}
+
+    def items(self) -> list[tuple[str, str]]:
+        return list(self._fields.items())
+
+
+class Card:
+    def __init__(self, cid: int, did: int = 1) -> None:
+        self.id = cid
+        self.nid = cid
+        self.did = did
+        self.odid = 0
+        self.ivl = 0
+        self.due = 0
+        self.queue = 0
+        self.type = 0
+
+    def note(self) -> Note:
+        return Note(self.nid)
+
+    def load(self) -> None:
+        pass
+
+
+class Scheduler:
+    def __init__(self) -> None:
+        self.day_cutoff = (int(time.time()) // 86_400 + 1) * 86_400
+
+    def answerButtons(self, card: Card) -> int:
+        return 4
+
+    def describe_next_states(self, states: Any) -> list[str]:
+        return ["1m", "10m", "1d", "4d"]
+
+
+class DB:
+    def __init__(self) -> None:
+        self._conn = sqlite3.connect(":memory:")
+        self._conn.executescript(
+            """
+            CREATE TABLE revlog (
+                id integer PRIMARY KEY, cid integer, usn integer, ease integer, ivl integer,
+                lastIvl integer, factor integer, time integer, type integer
+            );
+            CREATE TABLE cards (id integer PRIMARY KEY, nid integer, did integer, odid integer);
+            """
+        )
+
+    def scalar(self, sql: str, *args) -> Any:
+        row = self._conn.execute(sql, args).fetchone()
+        return row[0] if row else None
+
+    def all(self, sql: str, *args) -> list[list[Any]]:
+        return [list(row) for row in self._conn.execute(sql, args).fetchall()]
+
+    def list(self, sql: str, *args) -> list[Any]:
+        return [row[0] for row in self._conn.execute(sql, args).fetchall()]
+
+    def execute(self, sql: str, *args) -> None:
+        self._conn.execute(sql, args)
+
+
+class Decks:
+    def __init__(self, names: list[str]) -> None:
+        self._names = names
+
+    def all_names_and_ids(self) -> list[types.SimpleNamespace]:
+        return [types.SimpleNamespace(name=name, id=did) for did, name in enumerate(self._names, start=1)]
+
+    def get_current_id(self) -> int:
+        return self._names.index("Japanese") + 1
+
+    def deck_and_child_ids(self, did: int) -> list[int]:
+        name = self._names[did - 1]
+        return [deck.id for deck in self.all_names_and_ids() if deck.name == name or deck.name.startswith(f"{name}::")]
+
+
+class Collection:
+    path = ":memory:"
+    deck_names = ["Default", "Japanese", "Japanese::Vocab", "Japanese::Grammar"]
+
+    def __init__(self, n_cards: int = 500) -> None:
+        self.db = DB()
+        self.sched = Scheduler()
+        self.decks = Decks(self.deck_names)
+        self._cards = {cid: Card(cid, did=cid % len(self.deck_names) + 1) for cid in range(1, n_cards + 1)}
+        self._queue = list(self._cards)
+        self._position = 0
+        self._last_revlog_id = 0
+        for card in self._cards.values():
+            self.db.execute("INSERT INTO cards VALUES (?, ?, ?, ?)", card.id, card.nid, card.did, card.odid)
+
+    def schedVer(self) -> int:
+        return 2
+
+    def get_card(self, cid: int) -> Card:
+        return self._cards[cid]
+
+    def next_card(self) -> Card:
+        card = self._cards[self._queue[self._position % len(self._queue)]]
+        self._position += 1
+        return card
+
+    def answer(self, card: Card, ease: int) -> None:
+        self._last_revlog_id = max(int(time.time() * 1000), self._last_revlog_id + 1)
+        self.db.execute(
+            "INSERT INTO revlog VALUES (?, ?, 0, ?, 1, 0, 2500, 3000, 1)",
+            self._last_revlog_id,
+            card.id,
+            ease,
+        )
+        card.type, card.queue, card.ivl = 2, 2, card.ivl + ease
+
+    def undo(self) -> None:
+        self.db.execute("DELETE FROM revlog WHERE id = ?", self._last_revlog_id)
+        self._position = max(self._position - 1, 0)
+
+
+class Reviewer:
+    def __init__(self, mw: "MainWindow") -> None:
+        self.mw = mw
+        self.web = WebView()
+        self.bottom = types.SimpleNamespace(web=WebView())
+        self.card: Optional[Card] = None
+        self.state: Optional[str] = None
+        self.typeCorrect: Optional[str] = None
+        self.typedAnswer: Optional[str] = None
+        self._v3 = types.SimpleNamespace(states=None)
+
+    def _defaultEase(self) -> int:
+        return 3
+
+    def _answerButtonList(self) -> tuple[tuple[int, str], ...]:
+        buttons = ((1, "Again"), (2, "Hard"), (3, "Good"), (4, "Easy"))
+        return gui_hooks.reviewer_will_init_answer_buttons(buttons, self, self.card)
+
+    def _buttonTime(self, i: int, v3_labels: list[str]) -> str:
+        return f"<span class=nobold>{v3_labels[i - 1]}</span><br>"
+
+    def _answerButtons(self) -> str:
+        labels = self.mw.col.sched.describe_next_states(self._v3.states)
+        buf = "<center><table cellpadding=0 cellspacing=0><tr>"
+        for ease, label in self._answerButtonList():
+            extra = 'id="defease"' if ease == self._defaultEase() else ""
+            buf += (
+                f'\n<td align=center><button {extra} title="Shortcut key: {ease}" data-ease="{ease}" '
+                f"onclick='pycmd(\"ease{ease}\");'>{self._buttonTime(ease, labels)}{label}</button></td>"
+            )
+        return buf + "</tr></table>"
+
+    def _remaining(self) -> str:
+        return "<span class=new-count>10</span> + <span class=learn-count>20</span> + <span class=review-count>30</span>"
+
+    def _bottomHTML(self) -> str:
+        return """
+<center id=outer>
+<table id=innertable width=100% cellspacing=0 cellpadding=0>
+<tr>
+<td align=start valign=top class=stat>
+<button title="Shortcut key: E" onclick="pycmd('edit');">Edit</button></td>
+<td align=center valign=top id=middle>
+</td>
+<td align=end valign=top class=stat>
+<button title="Shortcut key: M" onclick="pycmd('more');">More &#9662;</button>
+<span id=time class=stattxt></span>
+</td>
+</tr>
+</table>
+</center>
+"""
+
+    def _showAnswerButton(self) -> None:
+        middle = f"<button id=ansbut onclick='pycmd(\"ans\");'>Show Answer<span class=stattxt>{self._remaining()}</span></button>"
+        self.bottom.web.eval(f"showQuestion({json.dumps(middle)}, 0);")
+
+    def _showEaseButtons(self) -> None:
+        self.bottom.web.eval(f"showAnswer({json.dumps(self._answerButtons())});")
+
+    def _showQuestion(self) -> None:
+        self.state = "question"
+        gui_hooks.reviewer_did_show_question(self.card)
+        self._showAnswerButton()
+
+    def _showAnswer(self) -> None:
+        self.state = "answer"
+        gui_hooks.reviewer_did_show_answer(self.card)
+        self._showEaseButtons()
+
+    def _getTypedAnswer(self) -> None:
+        self.web.evalWithCallback("getTypedAnswer();", self._onTypedAnswer)
+
+    def _onTypedAnswer(self, val: Optional[str]) -> None:
+        self.typedAnswer = val or ""
+        self._showAnswer()
+
+    def nextCard(self) -> None:
+        self.card = self.mw.col.next_card()
+        self._showQuestion()
+
+    def _answerCard(self, ease: int) -> None:
+        if self.state != "answer":
+            return
+        if self.mw.col.sched.answerButtons(self.card) < ease:
+            return
+        self.mw.col.answer(self.card, ease)
+        gui_hooks.reviewer_did_answer_card(self, self.card, ease)
+        self.nextCard()
+
+    def _shortcutKeys(self) -> list[tuple[str, Callable]]:
+        return [
+            ("e", lambda: None),
+            (" ", self._getTypedAnswer),
+            *((str(ease), lambda ease=ease: self._answerCard(ease)) for ease in range(1, 5)),
+            ("u", self.mw.undo),
+            ("5", lambda: None),
+        ]
+
+    def show(self) -> None:
+        self.mw.setStateShortcuts(self._shortcutKeys())
+        self.nextCard()
+
+
+class AddonManager:
+    def __init__(self, config: Optional[dict[str, Any]] = None) -> None:
+        with open(ADDON_DIR / "config.json", encoding="utf8") as f:
+            self._defaults = json.load(f)
+        self._config = copy.deepcopy(self._defaults)
+        self._config.update(config or {})
+        self.n_writes = 0
+
+    def addonConfigDefaults(self, module: str) -> dict[str, Any]:
+        return copy.deepcopy(self._defaults)
+
+    def getConfig(self, module: str) -> dict[str, Any]:
+        return self._config
+
+    def writeConfig(self, module: str, conf: dict[str, Any]) -> None:
+        self._config = conf
+        self.n_writes += 1
+
+    def addonFromModule(self, module: str) -> str:
+        return ADDON_PACKAGE
+
+    def setWebExports(self, module: str, pattern: str) -> None:
+        pass
+
+
+class TaskManager:
+    def __init__(self) -> None:
+        self._main_queue: collections.deque[Callable[[], None]] = collections.deque()
+
+    def run_on_main(self, func: Callable[[], None]) -> None:
+        if threading.current_thread() is threading.main_thread():
+            return func()
+        # Like Qt's event loop, calls from other threads wait for the main thread.
+        self._main_queue.append(func)
+
+    def run_pending_on_main(self) -> None:
+        while self._main_queue:
+            self._main_queue.popleft()()
+
+    def run_in_background(self, task: Callable[[], Any], on_done: Optional[Callable] = None) -> None:
+        result = task()
+        if on_done:
+            on_done(types.SimpleNamespace(result=lambda: result))
+
+
+class QueryOp:
+    """Runs the op right away, on the calling thread."""
+
+    def __init__(self, *, parent: Any, op: Callable[[Any], Any], success: Callable[[Any], Any]) -> None:
+        self._op = op
+        self._success = success
+        self._failure: Optional[Callable[[Exception], Any]] = None
+
+    def failure(self, failure: Callable[[Exception], Any]) -> "QueryOp":
+        self._failure = failure
+        return self
+
+    def run_in_background(self) -> None:
+        try:
+            result = self._op(aqt.mw.col)
+        except Exception as e:
+            if self._failure is None:
+                raise
+            return self._failure(e)
+        self._success(result)
+
+
+class MainWindow:
+    def __init__(self, config: Optional[dict[str, Any]] = None) -> None:
+        self.addonManager = AddonManager(config)
+        self.taskman = TaskManager()
+        self.pm = types.SimpleNamespace(name="standin")
+        self.form = QtStandIn()
+        self.web = WebView()
+        self.toolbar = types.SimpleNamespace(web=WebView())
+        self.col = Collection()
+        self.reviewer = Reviewer(self)
+        self.state = "deckBrowser"
+        self._bound_shortcuts: list[tuple[str, Callable]] = []
+        self.state_shortcuts: dict[str, Callable] = {}
+
+    def _update_state_shortcuts(self) -> None:
+        # Like QShortcut, a key bound twice is ambiguous and fires neither binding.
+        counts = collections.Counter(key for key, _ in self._bound_shortcuts)
+        self.state_shortcuts = {key: func for key, func in self._bound_shortcuts if counts[key] == 1}
+
+    def setStateShortcuts(self, shortcuts: list[tuple[str, Callable]]) -> dict[str, Callable]:
+        gui_hooks.state_shortcuts_will_change(self.state, shortcuts)
+        self._bound_shortcuts.extend(shortcuts)
+        self._update_state_shortcuts()
+        return self.state_shortcuts
+
+    def clearStateShortcuts(self) -> None:
+        self._bound_shortcuts.clear()
+        self._update_state_shortcuts()
+
+    def moveToState(self, state: str) -> None:
+        old_state = self.state
+        self.clearStateShortcuts()
+        if old_state == "review":
+            gui_hooks.reviewer_will_end()
+        self.state = state
+        gui_hooks.state_did_change(state, old_state)
+        if state == "review":
+            self.reviewer.show()
+
+    def undo(self) -> None:
+        self.col.undo()
+        # Same order as aqt's CollectionOp: the success callback first, then operation_did_execute.
+        changes = types.SimpleNamespace(card=True, note=True, deck=False, study_queues=True)
+        gui_hooks.state_did_undo(changes)
+        gui_hooks.operation_did_execute(changes, None)
+        self.reviewer.nextCard()
+
+
+class Translations:
+    def __getattr__(self, name: str) -> Callable[..., str]:
+        return lambda **kwargs: name
+
+
+class AddonConfigManager:
+    """Stand-in for ajt_common.addon_config.AddonConfigManager, backed by the stand-in add-on manager."""
+
+    def __init__(self, default: bool = False) -> None:
+        manager = aqt.mw.addonManager
+        self._default_config = manager.addonConfigDefaults(ADDON_PACKAGE)
+        self._config = copy.deepcopy(self._default_config) if default else manager.getConfig(ADDON_PACKAGE)
+
+    def __getitem__(self, key: str) -> Any:
+        return self._config[key]
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        self._config[key] = value
+
+    def keys(self):
+        return self._config.keys()
+
+    def items(self):
+        return self._config.items()
+
+    def bool_keys(self) -> list[str]:
+        return [key for key, value in self._default_config.items() if isinstance(value, bool)]
+
+    def write_config(self) -> None:
+        aqt.mw.addonManager.writeConfig(ADDON_PACKAGE, self._config)
+
+
+class ConfigSubViewBase:
+    _view_key: str
+
+    def __init__(self, parent: AddonConfigManager) -> None:
+        self._parent = parent
+
+    def _view(self) -> dict[str, Any]:
+        return self._parent[self._view_key]
+
+    def __getitem__(self, key: str) -> Any:
+        return self._view()[key]
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        self._view()[key] = value
+
+    def keys(self):
+        return self._view().keys()
+
+    def items(self):
+        return self._view().items()
+
+
+def html_to_text_line(html: str) -> str:
+    return re.sub(r"<[^<>]+>", "", html).replace("\n", " ").strip()
+
+
+def ids2str(ids: Iterable[int]) -> str:
+    return f"({','.join(str(i) for i in ids)})"
+
+
+def make_module(name: str, **attrs: Any) -> types.ModuleType:
+    module = types.ModuleType(name)
+    module.__dict__.update(attrs)
+    sys.modules[name] = module
+    return module
+
+
+def no_op(*args, **kwargs) -> None:
+    return None
+
+
+gui_hooks = GuiHooks("aqt.gui_hooks")
+aqt: types.ModuleType
+
+
+def install(config: Optional[dict[str, Any]] = None) -> MainWindow:
+    """
+    Register the stand-in anki and aqt modules. Must be called before importing add-on modules.
+    Values in `config` override the add-on's default config.
+    """
+    global aqt
+
+    sys.modules["aqt.gui_hooks"] = gui_hooks
+    qt = make_module("aqt.qt", qconnect=lambda signal, func: None)
+    for name in QT_NAMES:
+        setattr(qt, name, type(name, (QtStandIn,), {}))
+    qt.__all__ = [*QT_NAMES, "qconnect"]
+
+    make_module("anki")
+    make_module("anki.cards", Card=Card, CardId=NewType("CardId", int))
+    make_module("anki.collection", Collection=Collection, OpChanges=types.SimpleNamespace)
+    make_module("anki.decks", DeckId=NewType("DeckId", int))
+    make_module(
+        "anki.consts",
+        REVLOG_LRN=0,
+        REVLOG_REV=1,
+        REVLOG_RELRN=2,
+        REVLOG_CRAM=3,
+        REVLOG_RESCHED=4,
+    )
+    make_module("anki.errors", NotFoundError=type("NotFoundError", (Exception,), {}))
+    make_module("anki.utils", html_to_text_line=html_to_text_line, ids2str=ids2str)
+    make_module("anki.scheduler")
+    make_module("anki.scheduler.v3", Scheduler=Scheduler)
+
+    mw = MainWindow(config)
+    aqt = make_module("aqt", gui_hooks=gui_hooks, mw=mw, tr=Translations(), dialogs=QtStandIn(), qt=qt)
+    make_module("aqt.main", MainWindowState=str)
+    make_module("aqt.operations", QueryOp=QueryOp)
+    make_module("aqt.reviewer", Reviewer=Reviewer, ReviewerBottomBar=type("ReviewerBottomBar", (), {}))
+    make_module("aqt.toolbar", Toolbar=QtStandIn)
+    make_module("aqt.webview", WebContent=QtStandIn, AnkiWebView=QtStandIn)
+    make_module(
+        "aqt.utils",
+        tooltip=no_op,
+        restoreGeom=no_op,
+        saveGeom=no_op,
+        showInfo=no_op,
+        showWarning=no_op,
+    )
+
+    # Import add-on modules without running the package's __init__.py, which needs a real GUI.
+    package = make_module(ADDON_PACKAGE, __path__=[str(ADDON_DIR)])
+    make_module(f"{ADDON_PACKAGE}.ajt_common", __path__=[])
+    make_module(
+        f"{ADDON_PACKAGE}.ajt_common.addon_config",
+        AddonConfigManager=AddonConfigManager,
+        ConfigSubViewBase=ConfigSubViewBase,
+    )
+    make_module(f"{ADDON_PACKAGE}.ajt_common.consts", ADDON_SERIES="AJT")
+    package.ajt_common = sys.modules[f"{ADDON_PACKAGE}.ajt_common"]
+    return mw
+
+
+def load_addon() -> types.SimpleNamespace:
+    """Import and initialize the add-on. Returns a namespace holding its modules."""
+    modules = {}
+    for module_name, init_func in ADDON_INIT_SEQUENCE:
+        module = modules[module_name] = importlib.import_module(f"{ADDON_PACKAGE}.{module_name}")
+        func: Any = module
+        for attr in init_func.split("."):
+            func = getattr(func, attr)
+        func()
+    return types.SimpleNamespace(**modules)